@@ -1,30 +1,32 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Header, Response, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from auth_service.src.dto.auth import TokensDTO
-from auth_service.src.dto.user import UserCredentialsDTO
-from auth_service.src.security.JWTAuth import get_refresh_token
+from auth_service.src.dto.user import UserCredentialsDTO, UserPrincipalDTO, UserShortDTO
+from auth_service.src.security.JWTAuth import get_refresh_token, get_token_or_bearer
+from auth_service.src.security.rate_limit import rate_limit, rate_limit_login
 from auth_service.src.services.auth import AuthService, get_auth_service, get_token
+from auth_service.src.services.verify import AccessVerifier, get_access_verifier
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-@router.get("/refresh/", status_code=status.HTTP_200_OK)
+@router.get("/refresh/", status_code=status.HTTP_200_OK, dependencies=[Depends(rate_limit)])
 async def refresh(
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
     token: Annotated[str, Depends(get_refresh_token)],
 ):
     user = await auth_service.get_current_user_if_has_permissions(token)
-    tokens = await auth_service.update_tokens_pair(user)
+    tokens = await auth_service.update_tokens_pair(user, token)
     return tokens
 
 
-@router.get("/me/", status_code=status.HTTP_200_OK)
+@router.get("/me/", status_code=status.HTTP_200_OK, response_model=UserPrincipalDTO)
 async def get_me(
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
     token: Annotated[str, Depends(get_token)],
@@ -33,7 +35,12 @@ async def get_me(
     return user
 
 
-@router.post(path='/register', response_model=None, status_code=status.HTTP_201_CREATED)
+@router.post(
+    path='/register',
+    response_model=UserShortDTO,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(rate_limit)],
+)
 async def register(
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
     data: UserCredentialsDTO,
@@ -43,7 +50,9 @@ async def register(
     return data
 
 
-@router.post(path='/login', response_model=None, status_code=status.HTTP_200_OK)
+@router.post(
+    path='/login', response_model=None, status_code=status.HTTP_200_OK, dependencies=[Depends(rate_limit_login)]
+)
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     auth_service: AuthService = Depends(get_auth_service),
@@ -61,3 +70,36 @@ async def logout(
 ) -> JSONResponse:
     message = await auth_service.logout()
     return message
+
+
+@router.post(path='/logout-other-devices', response_model=None, status_code=status.HTTP_200_OK)
+async def logout_other_devices(
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+) -> JSONResponse:
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    message = await auth_service.logout_other_devices(user, token)
+    return message
+
+
+@router.get("/verify", status_code=status.HTTP_200_OK, response_model=None)
+async def verify(
+    token: Annotated[str, Depends(get_token_or_bearer)],
+    verifier: Annotated[AccessVerifier, Depends(get_access_verifier)],
+    original_uri: Annotated[str | None, Header(alias='X-Original-URI')] = None,
+) -> Response:
+    """Проверка токена для nginx auth_request (см. configs/auth-service.conf): 200, 401 или 403 без тела.
+
+    Без Postgres: подпись, срок, отзыв и право на X-Original-URI. Личность и права - в заголовках X-Auth-*,
+    Cache-Control разрешает nginx кэшировать ответ, но не дольше жизни токена.
+    """
+    payload, max_age = await verifier.verify(token, original_uri)
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "X-Auth-Login": payload['sub'],
+            "X-Auth-Role": payload.get('role', ''),
+            "X-Auth-Permissions": payload.get('perms', ''),
+            "Cache-Control": f"max-age={max_age}",
+        },
+    )
@@ -5,6 +5,9 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 
 from auth_service.src.dto.role import (
     PermissionDTO,
+    PermissionsCheckDTO,
+    PermissionsCheckResultDTO,
+    RolePermissionsChangeDTO,
     RoleCreateDTO,
     RoleDTO,
     RoleUpdateDTO,
@@ -115,6 +118,24 @@ async def check_user_permissions(
     return is_allowed
 
 
+@router.post(
+    "/check-user-permissions/batch",
+    status_code=status.HTTP_200_OK,
+    response_model=PermissionsCheckResultDTO,
+    tags=["permissions"],
+    description='Проверить доступ сразу к списку эндпоинтов (например, к категориям фильмов на странице каталога)',
+)
+async def check_user_permissions_batch(
+    data: PermissionsCheckDTO,
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    allowed = await auth_service.get_endpoints_access(data.endpoints, token)
+    bitmap = ''.join('1' if allowed[endpoint] else '0' for endpoint in data.endpoints)
+    return PermissionsCheckResultDTO(allowed=allowed, bitmap=bitmap)
+
+
 @router.get("/create-permissions", status_code=status.HTTP_200_OK, response_model=None, tags=["permissions"])
 async def create_permissions(
     service: RoleService,
@@ -147,3 +168,37 @@ async def set_permissions_to_role(
     role = await service.set_permissions_to_role(role_pk, permissions)
     # INFO деактивация токенов для юзеров, использующих роль
     await auth_service.invalidate_tokens(role)
+
+
+@router.post("/revoke-permissions-from-role", status_code=status.HTTP_200_OK, response_model=None, tags=["permissions"])
+async def revoke_permissions_from_role(
+    service: RoleService,
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    permissions: List[str],
+    role_pk: uuid.UUID,
+) -> None:
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    role = await service.revoke_permissions_from_role(role_pk, permissions)
+    await auth_service.invalidate_tokens(role)
+
+
+@router.put(
+    "/replace-role-permissions",
+    status_code=status.HTTP_200_OK,
+    response_model=RolePermissionsChangeDTO,
+    tags=["permissions"],
+    description='Заменить набор прав роли целиком',
+)
+async def replace_role_permissions(
+    service: RoleService,
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    permissions: List[str],
+    role_pk: uuid.UUID,
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    role, changes = await service.replace_permissions(role_pk, permissions)
+    if changes.added or changes.removed:
+        await auth_service.invalidate_tokens(role)
+    return changes
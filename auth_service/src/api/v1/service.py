@@ -0,0 +1,100 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from auth_service.src.cache.cache import Cache, get_cache_storage
+from auth_service.src.cache.decision import decision_cache
+from auth_service.src.cache.login_filter import login_filter
+from auth_service.src.cache.single_flight import principal_lookups
+from auth_service.src.core.profiling import request_profiler
+from auth_service.src.database.history_writer import history_writer
+from auth_service.src.database.session import get_pool_metrics
+from auth_service.src.dto.service import ProfileFileDTO, ProfilerArmDTO, ProfilerArmedDTO
+from auth_service.src.security.hashing import password_hasher
+from auth_service.src.security.JWTAuth import get_token
+from auth_service.src.security.rate_limit import rate_limiter
+from auth_service.src.services.auth import AuthService, get_auth_service
+
+router = APIRouter()
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=None, description='Метрики текущего воркера')
+async def get_stats(
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+) -> dict:
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    return {
+        "db_pool": get_pool_metrics(),
+        "password_hashing": password_hasher.get_metrics(),
+        "decision_cache": decision_cache.get_metrics(),
+        "history_writer": history_writer.get_metrics(),
+        "principal_lookups": principal_lookups.get_metrics(),
+        "login_filter": login_filter.get_metrics(),
+        "rate_limits": rate_limiter.get_metrics(),
+    }
+
+
+@router.post(
+    "/profiler",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ProfilerArmedDTO,
+    description='Профилировать следующие N запросов к маршруту и/или с заголовком (во всех воркерах)',
+)
+async def arm_profiler(
+    data: ProfilerArmDTO,
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    cache: Annotated[Cache, Depends(get_cache_storage)],
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    arm = await request_profiler.arm(cache, route=data.route, header=data.header, count=data.count, ttl=data.ttl)
+    return arm.to_event()
+
+
+@router.get("/profiler", status_code=status.HTTP_200_OK, response_model=list[ProfilerArmedDTO])
+async def get_profiler_arms(
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    return request_profiler.get_arms()
+
+
+@router.delete("/profiler", status_code=status.HTTP_200_OK, response_model=None)
+async def disarm_profiler(
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    cache: Annotated[Cache, Depends(get_cache_storage)],
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    await request_profiler.disarm(cache)
+    return {"message": "Профилирование отключено"}
+
+
+@router.get("/profiler/profiles", status_code=status.HTTP_200_OK, response_model=list[ProfileFileDTO])
+async def get_profiles(
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    return request_profiler.list_profiles()
+
+
+@router.get(
+    "/profiler/profiles/{name}",
+    status_code=status.HTTP_200_OK,
+    response_model=None,
+    description='Профиль в формате speedscope (https://www.speedscope.app)',
+)
+async def get_profile(
+    name: str,
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    path = request_profiler.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Профиль не найден')
+    return FileResponse(path, media_type='application/json', filename=name)
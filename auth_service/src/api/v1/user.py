@@ -1,8 +1,9 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import StreamingResponse
 
-from auth_service.src.dto.user import UserUpdateDTO
+from auth_service.src.dto.user import UserHistoryPageDTO, UserUpdateDTO
 from auth_service.src.security.JWTAuth import get_token
 from auth_service.src.services.auth import AuthService, get_auth_service
 from auth_service.src.services.user import UserService as user_service
@@ -35,13 +36,34 @@ async def change_password(
     return {"updated_password": True}
 
 
-@router.patch("/connection-history", status_code=status.HTTP_200_OK, response_model=None, tags=["auth"])
+@router.patch("/connection-history", status_code=status.HTTP_200_OK, response_model=UserHistoryPageDTO, tags=["auth"])
 async def history(
+    service: UserService,
     token: Annotated[str, Depends(get_token)],
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
     limit: int = Query(10, ge=1, le=100),  # Default 10, min 1, max 100
-    offset: int = Query(0, ge=0),  # Default offset 0
+    cursor: str | None = Query(None),  # next_cursor из предыдущей страницы
 ):
     user = await auth_service.get_current_user_if_has_permissions(token)
 
-    return user.sessions[offset:offset+limit]
+    return await service.get_history_page(user, limit, cursor)
+
+
+@router.get(
+    "/connection-history/export",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    tags=["auth"],
+    description='Выгрузка всей истории входов в NDJSON (для поддержки можно указать login пользователя)',
+)
+async def export_history(
+    service: UserService,
+    token: Annotated[str, Depends(get_token)],
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    login: str | None = None,
+):
+    user = await auth_service.get_current_user_if_has_permissions(token)
+    if login:
+        user = await service.find_by_login(login)
+
+    return StreamingResponse(service.export_history(user.pk), media_type="application/x-ndjson")
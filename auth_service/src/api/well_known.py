@@ -0,0 +1,24 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Request, Response, status
+
+from auth_service.src.core.config import settings
+from auth_service.src.security.JWTAuth import JWTAuth, get_jwt_auth
+
+router = APIRouter()
+
+
+@router.get("/jwks.json", status_code=status.HTTP_200_OK, response_model=None, tags=["jwks"])
+async def jwks(
+    request: Request,
+    response: Response,
+    jwt_auth: Annotated[JWTAuth, Depends(get_jwt_auth)],
+):
+    """Публичные ключи для локальной проверки access_token в других сервисах (см. security/verifier.py)."""
+    etag = f'"{jwt_auth.jwks_etag}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return jwt_auth.jwks
@@ -1,12 +1,44 @@
 import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from redis.asyncio import Redis
 
+from auth_service.src.core.config import settings
 from auth_service.src.database.redis import get_redis
 
 
+# INFO GCRA по нескольким ключам атомарно: запрос проходит, только если проходит все лимиты, и только тогда
+# сдвигает их TAT (theoretical arrival time). Время - TIME Redis, а не часы воркеров.
+# KEYS - ключи лимитов, ARGV - пары (интервал между запросами в мс, размер пачки).
+# Ответ - {сколько мс ждать, номер сработавшего лимита с 0} или {"0", -1}
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+local tats = {}
+local retry, limited = 0, -1
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local stored = redis.call('GET', key)
+    local tat = math.max(stored and tonumber(stored) or now, now) + interval
+    local wait = tat - burst * interval - now
+    if wait > retry then
+        retry, limited = wait, i - 1
+    end
+    tats[i] = tat
+end
+if limited >= 0 then
+    return {string.format('%.3f', retry), limited}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, string.format('%.3f', tats[i]), 'PX', math.ceil(tats[i] - now))
+end
+return {'0', -1}
+"""
+
+
 class BaseCacheStorage(ABC):
     """Абстрактное хранилище кэша.
 
@@ -24,11 +56,41 @@ class BaseCacheStorage(ABC):
     def retrieve_cache(self, key: str) -> Dict[str, Any]:
         """Получить кэш из хранилища."""
 
+    @abstractmethod
+    def retrieve_many(self, keys: List[str]) -> List[Any]:
+        """Получить значения нескольких ключей за одно обращение к хранилищу."""
+
+    @abstractmethod
+    def delete_cache(self, *keys: str) -> None:
+        """Удалить ключи из хранилища."""
+
+    @abstractmethod
+    def increment(self, key: str) -> int:
+        """Атомарно увеличить счетчик на 1 и вернуть новое значение."""
+
+    @abstractmethod
+    def publish(self, channel: str, message: str) -> None:
+        """Отправить сообщение подписчикам канала."""
+
+    @abstractmethod
+    def get_bits(self, key: str, offsets: List[int]) -> List[int]:
+        """Прочитать биты строки-битовой карты по смещениям за одно обращение."""
+
+    @abstractmethod
+    def set_bits(self, key: str, offsets: List[int]) -> None:
+        """Установить биты строки-битовой карты в 1 за одно обращение."""
+
+    @abstractmethod
+    def gcra(self, keys: List[str], limits: List[tuple[float, int]]) -> tuple[float, int]:
+        """Проверить лимиты GCRA (интервал в мс, пачка) атомарно: (мс до повтора, номер лимита) или (0, -1)."""
+
 
 class RedisCacheStorage(BaseCacheStorage):
 
     def __init__(self, redis_adapter: Redis) -> None:
         self.redis_adapter = redis_adapter
+        # INFO скрипт регистрируется один раз: вызов - EVALSHA, при NOSCRIPT redis-py загружает его и повторяет
+        self._gcra_script = redis_adapter.register_script(GCRA_SCRIPT)
 
     async def save_cache(self, key: str, cache: Dict[str, Any], expire: int | None = None) -> None:
         """Сохранить кэш в хранилище."""
@@ -40,6 +102,138 @@ class RedisCacheStorage(BaseCacheStorage):
         logging.debug(cache)
         return cache
 
+    async def retrieve_many(self, keys: List[str]) -> List[Any]:
+        """Получить значения нескольких ключей одной командой MGET."""
+        return await self.redis_adapter.mget(keys)
+
+    async def delete_cache(self, *keys: str) -> None:
+        """Удалить ключи из хранилища."""
+        await self.redis_adapter.delete(*keys)
+
+    async def increment(self, key: str) -> int:
+        """Атомарно увеличить счетчик на 1 и вернуть новое значение."""
+        return await self.redis_adapter.incr(key)
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Отправить сообщение в канал Redis pub/sub."""
+        await self.redis_adapter.publish(channel, message)
+
+    async def get_bits(self, key: str, offsets: List[int]) -> List[int]:
+        """Прочитать биты одной командой BITFIELD (GET u1 на каждое смещение)."""
+        operation = self.redis_adapter.bitfield(key)
+        for offset in offsets:
+            operation.get("u1", offset)
+        return await operation.execute()
+
+    async def set_bits(self, key: str, offsets: List[int]) -> None:
+        """Установить биты одной командой BITFIELD (SET u1 на каждое смещение)."""
+        operation = self.redis_adapter.bitfield(key)
+        for offset in offsets:
+            operation.set("u1", offset, 1)
+        await operation.execute()
+
+    async def gcra(self, keys: List[str], limits: List[tuple[float, int]]) -> tuple[float, int]:
+        """Проверить лимиты одним EVALSHA."""
+        retry, limited = await self._gcra_script(keys=keys, args=[value for limit in limits for value in limit])
+        return float(retry), int(limited)
+
+
+class InMemoryCacheStorage(BaseCacheStorage):
+    """Хранилище в памяти процесса с TTL. Значения хранятся в байтах, как их возвращает Redis.
+
+    Только для одного процесса без внешних сервисов (тесты, бенчмарки): воркеры gunicorn его не разделяют.
+    """
+
+    def __init__(self) -> None:
+        # INFO битовые карты - bytearray, меняются на месте, а не копированием всей строки
+        self._data: dict[str, tuple[bytes | bytearray, float | None]] = {}
+
+    async def save_cache(self, key: str, cache: Any, expire: int | None = None) -> None:
+        """Сохранить кэш в хранилище."""
+        self._data[key] = (self._encode(cache), time.monotonic() + expire if expire else None)
+
+    async def retrieve_cache(self, key: str) -> bytes | None:
+        """Получить кэш из хранилища."""
+        return self._get(key)
+
+    async def retrieve_many(self, keys: List[str]) -> List[Any]:
+        """Получить значения нескольких ключей."""
+        return [self._get(key) for key in keys]
+
+    async def delete_cache(self, *keys: str) -> None:
+        """Удалить ключи из хранилища."""
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def increment(self, key: str) -> int:
+        """Увеличить счетчик на 1 и вернуть новое значение. TTL ключа сохраняется, как у INCR."""
+        value = int(self._get(key) or 0) + 1
+        expires_at = self._data[key][1] if key in self._data else None
+        self._data[key] = (str(value).encode(), expires_at)
+        return value
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Других процессов нет, а отправитель применяет изменение у себя сам (см. RoleVersions.bump)."""
+
+    async def get_bits(self, key: str, offsets: List[int]) -> List[int]:
+        """Прочитать биты. Порядок битов как в Redis: смещение 0 - старший бит первого байта."""
+        value = self._get(key) or b""
+        return [
+            (value[offset >> 3] >> (7 - (offset & 7))) & 1 if offset >> 3 < len(value) else 0 for offset in offsets
+        ]
+
+    async def set_bits(self, key: str, offsets: List[int]) -> None:
+        """Установить биты в 1, при необходимости дополнив строку нулями, как SETBIT."""
+        value = self._get(key)
+        if not isinstance(value, bytearray):
+            value = bytearray(value or b"")
+            self._data[key] = (value, self._data[key][1] if key in self._data else None)
+        size = (max(offsets) >> 3) + 1
+        if size > len(value):
+            value.extend(bytes(size - len(value)))
+        for offset in offsets:
+            value[offset >> 3] |= 0x80 >> (offset & 7)
+
+    async def gcra(self, keys: List[str], limits: List[tuple[float, int]]) -> tuple[float, int]:
+        """Тот же алгоритм, что GCRA_SCRIPT."""
+        now = time.time() * 1000
+        tats = []
+        retry, limited = 0.0, -1
+        for index, (key, (interval, burst)) in enumerate(zip(keys, limits)):
+            stored = self._get(key)
+            tat = max(float(stored) if stored is not None else now, now) + interval
+            wait = tat - burst * interval - now
+            if wait > retry:
+                retry, limited = wait, index
+            tats.append(tat)
+        if limited >= 0:
+            return retry, limited
+        for key, tat in zip(keys, tats):
+            self._data[key] = (str(tat).encode(), time.monotonic() + (tat - now) / 1000)
+        return 0.0, -1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def _get(self, key: str) -> bytes | bytearray | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        # INFO как redis-py: str и числа хранятся строкой, вызывающий код декодирует их сам
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, (str, int, float)):
+            return str(value).encode()
+        raise TypeError(f"Invalid cache value type: {type(value).__name__}")
+
 
 class Cache:
     """Класс для работы с кэшэм."""
@@ -59,9 +253,47 @@ class Cache:
 
         return cache
 
+    async def get_many(self, keys: List[str]) -> List[Any]:
+        """Получить кэш нескольких ключей за одно обращение к хранилищу."""
+        return await self.storage.retrieve_many(keys)
+
+    async def delete_cache(self, *keys: str) -> None:
+        """Удалить кэш по ключам."""
+        await self.storage.delete_cache(*keys)
+
+    async def increment(self, key: str) -> int:
+        """Увеличить счетчик по ключу."""
+        return await self.storage.increment(key)
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Оповестить подписчиков канала (например, воркеры сервиса)."""
+        await self.storage.publish(channel, message)
+
+    async def get_bits(self, key: str, offsets: List[int]) -> List[int]:
+        """Прочитать биты битовой карты по смещениям."""
+        return await self.storage.get_bits(key, offsets)
+
+    async def set_bits(self, key: str, offsets: List[int]) -> None:
+        """Установить биты битовой карты."""
+        await self.storage.set_bits(key, offsets)
+
+    async def gcra(self, keys: List[str], limits: List[tuple[float, int]]) -> tuple[float, int]:
+        """Проверить и учесть запрос в лимитах GCRA."""
+        return await self.storage.gcra(keys, limits)
+
+
+memory_storage = InMemoryCacheStorage()
+# хранилище поверх текущего клиента Redis: создается заново, только если клиент сменился (новый lifespan)
+_redis_storage: RedisCacheStorage | None = None
+
 
 async def get_cache_storage():
+    # INFO выбор по настройке, а не через dependency_overrides: get_cache_storage вызывается и вне Depends
+    if settings.CACHE_BACKEND == "memory":
+        return Cache(storage=memory_storage)
+    global _redis_storage
     redis = await get_redis()
-    storage = RedisCacheStorage(redis_adapter=redis)
+    if _redis_storage is None or _redis_storage.redis_adapter is not redis:
+        _redis_storage = RedisCacheStorage(redis_adapter=redis)
 
-    return Cache(storage=storage)
+    return Cache(storage=_redis_storage)
@@ -0,0 +1,171 @@
+import json
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+from auth_service.src.cache.cache import Cache
+from auth_service.src.core.config import settings
+from auth_service.src.dto.user import UserPrincipalDTO
+from auth_service.src.security.revocation import TokenRevocation
+
+DECISION_KEY = "auth:decision:{jti}:{path}"
+# INFO эпохи инвалидации: глобальная (смена прав роли) и пользовательская (смена роли, логина, пароля)
+GLOBAL_EPOCH_KEY = "auth:decision:epoch"
+USER_EPOCH_KEY = "auth:decision:epoch:{login}"
+# INFO канал событий воркерам: изменения ролей (cache/role_versions.py) и сброс решений L1
+ROLE_EVENTS_CHANNEL = "auth:role_events"
+
+
+@dataclass
+class DecisionCacheMetrics:
+    local_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+
+
+@dataclass
+class DecisionLookup:
+    """Результат поиска решения в кэше.
+
+    checks - значения дополнительных ключей (проверки отзыва токена), прочитанных тем же MGET;
+    при попадании в L1 они не читаются и список пуст.
+    Если principal не найден, epochs нужно передать в DecisionCache.set(): решение,
+    вычисленное после параллельной инвалидации, сохранится со старой эпохой и не будет использовано.
+    """
+
+    principal: UserPrincipalDTO | None = None
+    checks: list[Any] = field(default_factory=list)
+    epochs: list[int] = field(default_factory=list)
+
+
+def _epoch(value: Any) -> int:
+    return int(value) if value is not None else 0
+
+
+class DecisionCache:
+    """Кэш решений get_current_user_if_has_permissions по (jti, path).
+
+    L1 - LRU в памяти воркера с коротким TTL, отвечает без Redis и Postgres.
+    L2 - Redis: запись, эпохи инвалидации и ключи проверки отзыва токена читаются одним MGET.
+    TTL обоих уровней не превышает оставшееся время жизни токена.
+
+    L1 при попадании не читает Redis, поэтому сброс (выход, изменения пользователя или прав ролей)
+    рассылается всем воркерам через ROLE_EVENTS_CHANNEL. Если сообщение потеряно (переподключение
+    к Redis), решение в L1 живет не дольше local_ttl.
+    """
+
+    def __init__(self, maxsize: int, local_ttl: int, ttl: int) -> None:
+        self._maxsize = maxsize
+        self._local_ttl = local_ttl
+        self._ttl = ttl
+        self._local: OrderedDict[tuple[str, str], tuple[float, UserPrincipalDTO]] = OrderedDict()
+        self.metrics = DecisionCacheMetrics()
+
+    async def get(self, cache: Cache, payload: dict[str, Any], path: str, check_keys: list[str]) -> DecisionLookup:
+        local_key = (payload['jti'], path)
+        local = self._local.get(local_key)
+        if local:
+            expires_at, principal = local
+            if expires_at > time.monotonic():
+                self._local.move_to_end(local_key)
+                self.metrics.local_hits += 1
+                return DecisionLookup(principal=principal)
+            del self._local[local_key]
+
+        entry, global_epoch, user_epoch, *checks = await cache.get_many(
+            [
+                DECISION_KEY.format(jti=payload['jti'], path=path),
+                GLOBAL_EPOCH_KEY,
+                USER_EPOCH_KEY.format(login=payload['sub']),
+                *check_keys,
+            ]
+        )
+        epochs = [_epoch(global_epoch), _epoch(user_epoch)]
+
+        if entry:
+            entry = json.loads(entry)
+            if entry['epochs'] == epochs:
+                principal = UserPrincipalDTO.model_validate(entry['principal'])
+                self.metrics.redis_hits += 1
+                return DecisionLookup(principal=principal, checks=checks, epochs=epochs)
+
+        self.metrics.misses += 1
+        return DecisionLookup(checks=checks, epochs=epochs)
+
+    def remember(self, payload: dict[str, Any], path: str, principal: UserPrincipalDTO) -> None:
+        """Положить решение, найденное в L2 и прошедшее проверки, в L1."""
+        self._set_local((payload['jti'], path), principal, payload)
+
+    async def set(
+        self, cache: Cache, payload: dict[str, Any], path: str, principal: UserPrincipalDTO, epochs: list[int]
+    ) -> None:
+        ttl = min(self._ttl, self._remaining(payload))
+        if ttl < 1:
+            return
+        self._set_local((payload['jti'], path), principal, payload)
+        entry = {"principal": principal.model_dump(mode="json"), "epochs": epochs}
+        await cache.set_cache(
+            key=DECISION_KEY.format(jti=payload['jti'], path=path), value=json.dumps(entry), expire=int(ttl)
+        )
+
+    async def invalidate_user(self, cache: Cache, login: str) -> None:
+        """Сбросить решения пользователя (смена роли, логина или пароля)."""
+        await cache.increment(USER_EPOCH_KEY.format(login=login))
+        # INFO /verify не читает решения и Postgres: ему нужна отметка времени изменения пользователя
+        await TokenRevocation(cache).require_reissue(login)
+        await self._broadcast(cache, {"decision": "user", "login": login})
+
+    async def invalidate_all(self, cache: Cache) -> None:
+        """Сбросить все решения (изменились права роли)."""
+        await cache.increment(GLOBAL_EPOCH_KEY)
+        await self._broadcast(cache, {"decision": "all"})
+
+    def forget_role(self, role_id: str) -> None:
+        """Убрать из L1 решения пользователей роли (изменились права роли)."""
+        for key in [key for key, (_, principal) in self._local.items() if str(principal.role_id) == role_id]:
+            del self._local[key]
+
+    async def forget_token(self, cache: Cache, jti: str) -> None:
+        """Убрать решения токена из L1 всех воркеров. В L2 отозванный токен отсекается проверкой отзыва."""
+        await self._broadcast(cache, {"decision": "token", "jti": jti})
+
+    def apply(self, event: dict[str, Any]) -> None:
+        """Сбросить решения L1 по событию из канала (от этого или другого воркера)."""
+        if event["decision"] == "all":
+            self._local.clear()
+            return
+        if event["decision"] == "user":
+            keys = [key for key, (_, principal) in self._local.items() if principal.login == event["login"]]
+        else:
+            keys = [key for key in self._local if key[0] == event["jti"]]
+        for key in keys:
+            del self._local[key]
+
+    async def _broadcast(self, cache: Cache, event: dict[str, Any]) -> None:
+        # INFO сначала у себя: ответ на запрос, вызвавший сброс, не зависит от доставки сообщения
+        self.apply(event)
+        await cache.publish(ROLE_EVENTS_CHANNEL, json.dumps(event))
+
+    def get_metrics(self) -> dict[str, Any]:
+        return {**asdict(self.metrics), "local_size": len(self._local)}
+
+    def _set_local(self, key: tuple[str, str], principal: UserPrincipalDTO, payload: dict[str, Any]) -> None:
+        ttl = min(self._local_ttl, self._remaining(payload))
+        if ttl <= 0:
+            return
+        self._local[key] = (time.monotonic() + ttl, principal)
+        self._local.move_to_end(key)
+        while len(self._local) > self._maxsize:
+            self._local.popitem(last=False)
+
+    @staticmethod
+    def _remaining(payload: dict[str, Any]) -> float:
+        return payload['exp'] - time.time()
+
+
+decision_cache = DecisionCache(
+    maxsize=settings.DECISION_CACHE_SIZE,
+    local_ttl=settings.DECISION_CACHE_LOCAL_TTL,
+    ttl=settings.DECISION_CACHE_TTL,
+)
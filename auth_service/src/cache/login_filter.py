@@ -0,0 +1,113 @@
+import hashlib
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from auth_service.src.cache.cache import Cache
+from auth_service.src.core.config import settings
+from auth_service.src.database.models.user import User
+from auth_service.src.database.repository.user import UserRepository
+from auth_service.src.database.session import get_db_session_for_main
+
+# INFO размер и число хешей в ключе: после смены настроек фильтр строится заново в новом ключе
+LOGIN_FILTER_KEY = "auth:login_filter:{bits}:{hashes}"
+# последний логин, уже внесенный в фильтр при сборке: прерванная сборка продолжается с него
+LOGIN_FILTER_CURSOR_KEY = "auth:login_filter:{bits}:{hashes}:cursor"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoginFilterMetrics:
+    checks: int = 0
+    # логина точно нет - запрос в Postgres не нужен
+    negatives: int = 0
+    # фильтр не собран (или потерян вместе с Redis) - ответ "возможно есть"
+    not_ready: int = 0
+
+
+class LoginFilter:
+    """Фильтр Блума существующих логинов в битовой карте Redis (общий для воркеров).
+
+    "Нет" - точно нет: регистрация не проверяет логин SELECT-ом, вход с таким логином не идет в Postgres.
+    "Возможно есть" - дальше обычная проверка в базе. Удалить логин из фильтра нельзя: удаленный или
+    смененный логин остается ложноположительным, это стоит одного SELECT.
+
+    Признак готовности - бит сразу за фильтром: проверка и готовность читаются одной командой BITFIELD,
+    а при потере ключа (FLUSHALL, новый Redis) фильтр считается не собранным, а не пустым.
+    """
+
+    def __init__(self, bits: int, hashes: int, batch_size: int) -> None:
+        self._bits = bits
+        self._hashes = hashes
+        self._batch_size = batch_size
+        self._key = LOGIN_FILTER_KEY.format(bits=bits, hashes=hashes)
+        self._cursor_key = LOGIN_FILTER_CURSOR_KEY.format(bits=bits, hashes=hashes)
+        self.metrics = LoginFilterMetrics()
+
+    @property
+    def enabled(self) -> bool:
+        return self._bits > 0
+
+    def offsets(self, login: str) -> list[int]:
+        # INFO двойное хеширование (Kirsch-Mitzenmacher): k позиций из одного blake2b
+        digest = hashlib.blake2b(login.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        step = int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * step) % self._bits for i in range(self._hashes)]
+
+    async def may_exist(self, cache: Cache, login: str) -> bool:
+        if not self.enabled:
+            return True
+        self.metrics.checks += 1
+        ready, *bits = await cache.get_bits(self._key, [self._bits, *self.offsets(login)])
+        if not ready:
+            self.metrics.not_ready += 1
+            return True
+        if all(bits):
+            return True
+        self.metrics.negatives += 1
+        return False
+
+    async def add(self, cache: Cache, *logins: str) -> None:
+        """Внести логины. Вызывается до записи в базу: сбой после записи не оставит логин вне фильтра."""
+        if self.enabled and logins:
+            await cache.set_bits(self._key, [offset for login in logins for offset in self.offsets(login)])
+
+    async def is_ready(self, cache: Cache) -> bool:
+        return not self.enabled or (await cache.get_bits(self._key, [self._bits]))[0] == 1
+
+    async def rebuild(self, cache: Cache) -> bool:
+        """Собрать фильтр из users пачками, если он не готов. Возвращает False, если сборка не понадобилась.
+
+        Параллельные сборки (несколько воркеров) безопасны: биты только взводятся.
+        Логины, созданные во время сборки, вносит сама регистрация.
+        """
+        if await self.is_ready(cache):
+            return False
+        cursor = await cache.get_cache(self._cursor_key)
+        after = cursor.decode() if cursor is not None else None
+        added = 0
+        while True:
+            async with get_db_session_for_main() as session:
+                logins = await UserRepository(User, session).get_logins_page(self._batch_size, after)
+            if not logins:
+                break
+            await self.add(cache, *logins)
+            after = logins[-1]
+            await cache.set_cache(key=self._cursor_key, value=after)
+            added += len(logins)
+        await cache.set_bits(self._key, [self._bits])
+        await cache.delete_cache(self._cursor_key)
+        logger.info("login filter built: %s logins", added)
+        return True
+
+    def get_metrics(self) -> dict[str, Any]:
+        return {**asdict(self.metrics), "bits": self._bits, "hashes": self._hashes}
+
+
+login_filter = LoginFilter(
+    bits=settings.LOGIN_FILTER_BITS,
+    hashes=settings.LOGIN_FILTER_HASHES,
+    batch_size=settings.LOGIN_FILTER_BATCH_SIZE,
+)
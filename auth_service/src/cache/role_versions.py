@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from auth_service.src.cache.cache import Cache
+from auth_service.src.cache.decision import ROLE_EVENTS_CHANNEL, decision_cache
+from auth_service.src.database.models.role import Role
+
+ROLE_VERSION_KEY = "auth:role_version:{role}"
+
+logger = logging.getLogger(__name__)
+
+
+class RoleVersions:
+    """Инвалидация токенов всех пользователей роли одной записью в Redis.
+
+    При изменении прав роли ее версия (Role.version) записывается в Redis и рассылается через pub/sub.
+    Токен хранит версию роли на момент выпуска (claim rv); токен с устаревшей версией перевыпускается.
+    Каждый воркер слушает канал, обновляет версии в памяти и сразу убирает решения роли из L1 кэша.
+    Если сообщение потеряно (переподключение к Redis), версия все равно читается из Redis в MGET
+    кэша решений, а L1 живет не дольше DECISION_CACHE_LOCAL_TTL.
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[str, int] = {}
+
+    @staticmethod
+    def keys(payload: dict[str, Any]) -> list[str]:
+        return [ROLE_VERSION_KEY.format(role=payload['role'])] if payload.get('role') else []
+
+    def is_stale(self, payload: dict[str, Any], values: list[Any]) -> bool:
+        role = payload.get('role')
+        if not role:
+            return False
+        current = self._versions.get(role, 0)
+        if values:
+            current = max(current, int(values[0] or 0))
+        return payload.get('rv', 0) < current
+
+    async def bump(self, cache: Cache, role: Role) -> None:
+        """Опубликовать новую версию роли (после изменения ее прав)."""
+        role_id = str(role.pk)
+        await cache.set_cache(key=ROLE_VERSION_KEY.format(role=role_id), value=role.version)
+        await cache.publish(ROLE_EVENTS_CHANNEL, json.dumps({"role": role_id, "version": role.version}))
+        self._apply(role_id, role.version)
+
+    def _apply(self, role_id: str, version: int) -> None:
+        self._versions[role_id] = max(self._versions.get(role_id, 0), version)
+        decision_cache.forget_role(role_id)
+
+    async def listen(self, redis: Redis) -> None:
+        """Фоновая задача воркера: применять изменения ролей и сброс решений, сделанные в других воркерах."""
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(ROLE_EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            event = json.loads(message['data'])
+                            if 'decision' in event:
+                                decision_cache.apply(event)
+                            else:
+                                self._apply(event['role'], event['version'])
+            except RedisError:
+                logger.exception("role events subscription lost, reconnecting")
+                await asyncio.sleep(1)
+
+
+role_versions = RoleVersions()
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from auth_service.src.core.metrics import SINGLE_FLIGHT_CALLS
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SingleFlightMetrics:
+    # вызовы, которые действительно пошли в источник
+    calls: int = 0
+    # вызовы, получившие результат уже выполняющегося вызова
+    shared: int = 0
+
+
+class SingleFlight:
+    """Одновременные вызовы с одним ключом ждут одну и ту же задачу (в пределах воркера).
+
+    Вызов выполняется отдельной задачей: отмена запроса, который его начал, не отменяет его для остальных.
+    Результат не кэшируется - после завершения следующий вызов снова идет в источник.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self.metrics = SingleFlightMetrics()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.metrics.calls += 1
+            SINGLE_FLIGHT_CALLS.labels(self._name, "leader").inc()
+        else:
+            self.metrics.shared += 1
+            SINGLE_FLIGHT_CALLS.labels(self._name, "shared").inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # INFO все ожидающие могли быть отменены: забираем исключение, чтобы asyncio не ругался в лог
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("%s single flight failed: %r", self._name, task.exception())
+
+    def get_metrics(self) -> dict[str, Any]:
+        return {**asdict(self.metrics), "in_flight": len(self._tasks)}
+
+
+principal_lookups = SingleFlight("principal")
@@ -13,14 +13,75 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=f"{BASE_DIR}/../../configs/.env", extra="ignore")
     PROJECT_NAME: str
     POSTGRES_DSN: str
+    # пул соединений к postgres (на каждый воркер gunicorn)
+    POSTGRES_POOL_SIZE: int = 10
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30
+    POSTGRES_POOL_PRE_PING: bool = True
+    POSTGRES_POOL_RECYCLE: int = 1800
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
+    # RS256/EdDSA: каталог с приватными ключами {kid}.pem и kid для подписи (пусто - последний по имени)
+    JWT_KEYS_DIR: str | None = None
+    JWT_ACTIVE_KID: str | None = None
+    JWKS_MAX_AGE: int = 300
     ACCESS_TOKEN_EXPIRE_MINUTES: timedelta = timedelta(minutes=30)
     REFRESH_TOKEN_EXPIRE_MINUTES: timedelta = timedelta(minutes=60 * 24 * 7)
+    # хеширование паролей вне event loop: process | thread
+    PASSWORD_HASH_EXECUTOR: str = "process"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    # схема (pbkdf2_sha256 | bcrypt) и раунды хеширования паролей - подбирает `createsuperuser.py calibrate-hash`.
+    # Хеши с другой схемой или раундами пересчитываются в фоне при успешном входе
+    PASSWORD_HASH_SCHEME: str = "pbkdf2_sha256"
+    PASSWORD_HASH_ROUNDS: int = 30000
+    # кэш решений авторизации: размер LRU в памяти воркера, TTL в памяти и в Redis (сек)
+    DECISION_CACHE_SIZE: int = 10000
+    DECISION_CACHE_LOCAL_TTL: int = 5
+    DECISION_CACHE_TTL: int = 300
+    # /api/v1/auth/verify (nginx auth_request): сколько секунд nginx кэширует положительный ответ.
+    # Столько же может жить в кэше nginx отозванный токен
+    VERIFY_CACHE_MAX_AGE: int = 10
+    # размер пачки при выгрузке истории входов в NDJSON
+    HISTORY_EXPORT_BATCH_SIZE: int = 1000
+    # запись истории входов пачками вне запроса: memory (очередь воркера) | redis (Redis Stream, переживает падение воркера)
+    HISTORY_WRITER_MODE: str = "memory"
+    HISTORY_WRITER_BATCH_SIZE: int = 500
+    HISTORY_WRITER_FLUSH_INTERVAL: float = 1.0
+    HISTORY_WRITER_QUEUE_SIZE: int = 10000
+    # redis: после скольких неудачных доставок сообщение переносится в auth:history:dead;
+    # memory: сколько раз пачка пишется повторно, пока база недоступна
+    HISTORY_WRITER_MAX_DELIVERIES: int = 5
+    # фильтр Блума существующих логинов (регистрация и неудачный вход без Postgres): размер в битах, число хешей,
+    # пачка логинов при сборке. 2^24 бит (2 МиБ) и 7 хешей - около 1% ложных "возможно есть" на 1.6 млн логинов.
+    # 0 - выключено
+    LOGIN_FILTER_BITS: int = 1 << 24
+    LOGIN_FILTER_HASHES: int = 7
+    LOGIN_FILTER_BATCH_SIZE: int = 5000
+    # лимиты запросов по шаблону маршрута (GCRA в Redis, одна команда на проверку), превышение - 429 с Retry-After
+    # до хеширования пароля. {"маршрут": {"login" | "ip" | "global": "запросов/секунд"}}, login - только для входа.
+    # IP - из X-Real-IP (nginx). {} - выключено
+    RATE_LIMITS: dict[str, dict[str, str]] = {
+        "/api/v1/auth/login": {"login": "10/60", "ip": "30/60", "global": "200/1"},
+        "/api/v1/auth/register": {"ip": "10/60", "global": "50/1"},
+        "/api/v1/auth/refresh/": {"ip": "60/60"},
+    }
+    # адреса (или сети) прокси, от которых принимается X-Real-IP: nginx из docker-compose и локальный запуск
+    TRUSTED_PROXIES: list[str] = ["127.0.0.1", "172.18.0.10"]
     ADMIN_PASSWORD: str
     ADMIN_LOGIN: str
     REDIS_HOST: str
     REDIS_PORT: int
+    # бюджет SQL-запросов на HTTP-запрос (staging): при превышении в лог пишутся маршрут и повторяющиеся
+    # запросы (N+1). 0 - выключено. QUERY_BUDGET_ROUTES - свой бюджет для маршрута, JSON {"/api/v1/...": 5}
+    QUERY_BUDGET: int = 0
+    QUERY_BUDGET_ROUTES: dict[str, int] = {}
+    # профилирование запросов по заявке админа (pyinstrument): каталог-кольцо профилей, их число, интервал выборки (сек)
+    PROFILER_DIR: str = "/tmp/auth_profiles"
+    PROFILER_MAX_FILES: int = 50
+    PROFILER_INTERVAL: float = 0.001
+    # хранилище кэша: redis | memory (в памяти одного процесса - тесты и бенчмарки без Redis)
+    CACHE_BACKEND: str = "redis"
 
 
 # Инициализация настроек
@@ -0,0 +1,140 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_PATH = "/metrics"
+
+# INFO границы от долей миллисекунды (кэш решений) до секунд (хеширование пароля под нагрузкой)
+_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REQUEST_DURATION = Histogram(
+    "auth_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+    buckets=_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "auth_http_requests_in_progress",
+    "HTTP-запросы в обработке",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+COMPONENT_DURATION = Histogram(
+    "auth_request_component_duration_seconds",
+    "Время запроса, проведенное в SQL, Redis, JWT и хешировании паролей",
+    ["route", "component"],
+    buckets=_BUCKETS,
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "auth_single_flight_calls_total",
+    "Вызовы через single flight: leader - выполнен, shared - получил результат выполняющегося",
+    ["name", "result"],
+)
+RATE_LIMITED = Counter(
+    "auth_rate_limited_total",
+    "Запросы, отклоненные лимитами (429), по маршруту и области лимита",
+    ["route", "scope"],
+)
+
+# время по компонентам для текущего запроса; вне запроса (фоновые задачи, lifespan) - None
+_components: ContextVar[dict[str, float] | None] = ContextVar("request_components", default=None)
+
+
+@contextmanager
+def track(component: str) -> Iterator[None]:
+    """Учесть время блока в разбивке текущего запроса (sql, redis, jwt, hash)."""
+    components = _components.get()
+    if components is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        components[component] = components.get(component, 0.0) + time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    components = _components.get()
+    if components is not None:
+        components["sql"] = components.get("sql", 0.0) + time.perf_counter() - context._metrics_started
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Время SQL-запросов по событиям engine. SQLAlchemy переносит contextvars в свой greenlet."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность по шаблону маршрута, запросы в обработке и разбивка времени по компонентам.
+
+    Шаблон маршрута (/api/v1/users/{pk}) FastAPI кладет в scope["route"] при маршрутизации,
+    поэтому метка route не зависит от значений параметров. Не найденные маршруты - route="unmatched".
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        components: dict[str, float] = {}
+        token = _components.set(components)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            _components.reset(token)
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            REQUEST_DURATION.labels(method, template, status_code).observe(elapsed)
+            for component, seconds in components.items():
+                COMPONENT_DURATION.labels(template, component).observe(seconds)
+
+
+def metrics_endpoint(request: Request) -> Response:
+    # INFO под gunicorn каждый воркер пишет метрики в файлы PROMETHEUS_MULTIPROC_DIR, ответ собирается из всех
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
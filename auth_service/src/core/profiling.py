@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from auth_service.src.cache.cache import Cache, get_cache_storage
+from auth_service.src.core.config import settings
+from auth_service.src.security.matcher import PathMatcher
+
+PROFILER_CHANNEL = "auth:profiler"
+# сколько запросов уже взято на профилирование всеми воркерами
+PROFILER_TAKEN_KEY = "auth:profiler:{id}:taken"
+PROFILE_SUFFIX = ".speedscope.json"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProfilerArm:
+    """Заявка на профилирование: следующие count запросов к route и/или с заголовком header."""
+
+    id: str
+    count: int
+    expires_at: float
+    route: str | None = None
+    header: str | None = None
+    _matcher: PathMatcher | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.route:
+            self._matcher = PathMatcher([self.route])
+
+    def matches(self, scope: Scope) -> bool:
+        if self._matcher is not None and self._matcher.match(scope["path"]) is None:
+            return False
+        if self.header is not None:
+            name = self.header.lower().encode()
+            return any(key == name for key, _ in scope["headers"])
+        return True
+
+    def to_event(self) -> dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if not key.startswith("_")}
+
+
+class RequestProfiler:
+    """Профилирование отдельных запросов по заявке админа (pyinstrument, async-aware).
+
+    Заявка рассылается воркерам через pub/sub; общий лимит запросов считает INCR в Redis, поэтому
+    профилируется ровно count запросов на весь кластер. Пока заявок нет, middleware проверяет
+    только пустой словарь. Профили в формате speedscope пишутся в каталог-кольцо из max_files файлов.
+    """
+
+    def __init__(self, directory: str, max_files: int, interval: float) -> None:
+        self._directory = directory
+        self._max_files = max_files
+        self._interval = interval
+        self._arms: dict[str, ProfilerArm] = {}
+
+    @property
+    def armed(self) -> bool:
+        return bool(self._arms)
+
+    async def arm(self, cache: Cache, route: str | None, header: str | None, count: int, ttl: int) -> ProfilerArm:
+        arm = ProfilerArm(id=uuid.uuid4().hex, count=count, expires_at=time.time() + ttl, route=route, header=header)
+        await cache.set_cache(key=PROFILER_TAKEN_KEY.format(id=arm.id), value=0, expire=ttl)
+        await cache.publish(PROFILER_CHANNEL, json.dumps({"arm": arm.to_event()}))
+        self._apply({"arm": arm.to_event()})
+        return arm
+
+    async def disarm(self, cache: Cache) -> None:
+        await cache.publish(PROFILER_CHANNEL, json.dumps({"disarm": True}))
+        self._apply({"disarm": True})
+
+    def start(self) -> Any:
+        from pyinstrument import Profiler
+
+        # INFO async_mode=enabled: в профиль попадает только эта задача, а не соседние запросы в event loop
+        profiler = Profiler(interval=self._interval, async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    def get_arms(self) -> list[dict[str, Any]]:
+        return [arm.to_event() for arm in self._arms.values()]
+
+    def _apply(self, event: dict[str, Any]) -> None:
+        if event.get("disarm"):
+            self._arms.clear()
+        elif arm := event.get("arm"):
+            self._arms[arm["id"]] = ProfilerArm(**arm)
+
+    async def take(self, cache: Cache, scope: Scope) -> ProfilerArm | None:
+        """Заявка, под которую попал запрос, если ее лимит еще не исчерпан."""
+        now = time.time()
+        for arm in list(self._arms.values()):
+            if arm.expires_at <= now:
+                self._arms.pop(arm.id, None)
+                continue
+            if not arm.matches(scope):
+                continue
+            try:
+                taken = await cache.increment(PROFILER_TAKEN_KEY.format(id=arm.id))
+            except RedisError:
+                # INFO профилирование необязательно: без Redis запрос просто идет без профиля
+                logger.exception("profiler limit check failed, request not profiled")
+                return None
+            if taken >= arm.count:
+                self._arms.pop(arm.id, None)
+            if taken <= arm.count:
+                return arm
+        return None
+
+    async def listen(self, redis: Redis) -> None:
+        """Фоновая задача воркера: заявки, созданные через другие воркеры."""
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(PROFILER_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._apply(json.loads(message['data']))
+            except RedisError:
+                logger.exception("profiler subscription lost, reconnecting")
+                await asyncio.sleep(1)
+
+    def save(self, profiler: Any, scope: Scope, arm: ProfilerArm) -> str:
+        """Записать профиль в кольцо (блокирующий ввод-вывод - вызывать в потоке)."""
+        from pyinstrument.renderers import SpeedscopeRenderer
+
+        os.makedirs(self._directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:80]
+        name = f"{datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}-{scope['method']}-{slug}{PROFILE_SUFFIX}"
+        with open(os.path.join(self._directory, name), "w") as file:
+            file.write(profiler.output(renderer=SpeedscopeRenderer()))
+        logger.info("request profile %s saved (arm %s)", name, arm.id)
+        self._prune()
+        return name
+
+    def _prune(self) -> None:
+        # INFO имена начинаются со времени, сортировка по имени - по возрасту; файл могли удалить другие воркеры
+        for name in self._names()[:-self._max_files]:
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _names(self) -> list[str]:
+        if not os.path.isdir(self._directory):
+            return []
+        return sorted(name for name in os.listdir(self._directory) if name.endswith(PROFILE_SUFFIX))
+
+    def list_profiles(self) -> list[dict[str, Any]]:
+        profiles = []
+        for name in reversed(self._names()):
+            try:
+                stat = os.stat(os.path.join(self._directory, name))
+            except FileNotFoundError:
+                continue
+            profiles.append({"name": name, "size": stat.st_size, "created_at": datetime.fromtimestamp(stat.st_mtime)})
+        return profiles
+
+    def profile_path(self, name: str) -> str | None:
+        # INFO только имена из кольца: без путей и с нашим суффиксом
+        if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = os.path.join(self._directory, name)
+        return path if os.path.isfile(path) else None
+
+
+request_profiler = RequestProfiler(
+    directory=settings.PROFILER_DIR,
+    max_files=settings.PROFILER_MAX_FILES,
+    interval=settings.PROFILER_INTERVAL,
+)
+
+
+class ProfilerMiddleware:
+    """Профилирует запросы, попавшие под заявку request_profiler. Без заявок - одна проверка словаря."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not request_profiler.armed:
+            await self.app(scope, receive, send)
+            return
+        arm = await request_profiler.take(await get_cache_storage(), scope)
+        if arm is None:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = request_profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            try:
+                await asyncio.to_thread(request_profiler.save, profiler, scope, arm)
+            except Exception:
+                # INFO ошибка записи или рендера профиля не должна заменять ответ или исключение самого запроса
+                logger.exception("request profile not saved")
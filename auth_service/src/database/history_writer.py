@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import DataError, IntegrityError
+
+from auth_service.src.core.config import settings
+from auth_service.src.database import redis
+from auth_service.src.database.models.user import User, UserSessionLog
+from auth_service.src.database.repository.user import UserRepository
+from auth_service.src.database.session import get_db_session_for_main
+
+HISTORY_STREAM = "auth:history"
+HISTORY_GROUP = "history-writers"
+# через сколько мс сообщения упавшего воркера забирает другой
+HISTORY_CLAIM_IDLE_MS = 60_000
+# сообщения, которые не удалось записать max_deliveries раз (например, пользователь уже удален)
+HISTORY_DEAD_STREAM = "auth:history:dead"
+# имя фоновой задачи записи (по нему ее запросы отличают от запросов обработчиков, например в тестах)
+HISTORY_WRITER_TASK = "history-writer"
+# длина sessions.info: длинный user-agent обрезается при постановке в очередь, а не отвергается базой
+USER_AGENT_MAX_LENGTH = UserSessionLog.info.type.length
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HistoryWriterMetrics:
+    queued: int = 0
+    written: int = 0
+    batches: int = 0
+    # очередь переполнена - запись выполнена прямо в запросе
+    inline: int = 0
+    errors: int = 0
+    # перенесены в HISTORY_DEAD_STREAM
+    dead: int = 0
+
+
+class HistoryWriter:
+    """Запись истории входов (user-agent) вне запроса логина, пачками.
+
+    memory - очередь в памяти воркера: сбрасывается в Postgres по размеру пачки или по интервалу,
+             при остановке воркера дописывается (drain). Записи в очереди теряются при падении процесса.
+    redis  - XADD в Redis Stream; воркеры читают поток группой потребителей и подтверждают (XACK) записанное.
+             Не подтвержденное упавшим воркером забирают другие (XAUTOCLAIM). Сообщение, которое не записалось
+             max_deliveries раз, переносится в HISTORY_DEAD_STREAM, чтобы одна плохая запись не читалась вечно.
+
+    В обоих режимах запись идет одним multi-row INSERT ... ON CONFLICT (pk) DO NOTHING,
+    поэтому повторная доставка той же пачки не создает дублей. Если пачку отвергла сама база (ошибка
+    в одной из строк, например пользователь уже удален), строки пишутся по одной и теряется только плохая.
+    """
+
+    def __init__(
+        self, mode: str, batch_size: int, flush_interval: float, queue_size: int, max_deliveries: int
+    ) -> None:
+        self._mode = mode
+        self._max_deliveries = max_deliveries
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        # пачка, взятая из очереди и еще не записанная: при остановке дописывается вместе с очередью
+        self._inflight: list[dict] = []
+        self._consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._task: asyncio.Task | None = None
+        self.metrics = HistoryWriterMetrics()
+
+    async def add(self, user_id: uuid.UUID, user_agent: str) -> None:
+        # INFO pk и время входа фиксируются сразу, а не при записи пачки
+        connection = {
+            "pk": uuid.uuid4(),
+            "user_id": user_id,
+            "info": user_agent[:USER_AGENT_MAX_LENGTH] if user_agent else user_agent,
+            "created_at": datetime.now(),
+        }
+        self.metrics.queued += 1
+        if self._mode == "redis":
+            await redis.redis.xadd(HISTORY_STREAM, self._encode(connection))
+            return
+        try:
+            self._queue.put_nowait(connection)
+        except asyncio.QueueFull:
+            self.metrics.inline += 1
+            await self._write([connection])
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        if self._mode == "redis":
+            try:
+                await redis.redis.xgroup_create(HISTORY_STREAM, HISTORY_GROUP, id="0", mkstream=True)
+            except ResponseError:
+                pass  # группа уже создана другим воркером
+            self._task = asyncio.create_task(self._consume_stream(redis.redis), name=HISTORY_WRITER_TASK)
+        else:
+            self._task = asyncio.create_task(self._consume_queue(), name=HISTORY_WRITER_TASK)
+
+    async def shutdown(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # drain: дописать недописанную пачку и то, что осталось в очереди воркера
+        batch, self._inflight = self._inflight, []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._write_rows(batch)
+
+    async def _consume_queue(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # INFO собираемая и записываемая пачка: при остановке ее дописывает drain в shutdown
+            self._inflight = batch = [await self._queue.get()]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+            self._inflight = []
+
+    async def _flush(self, batch: list[dict]) -> None:
+        """Записать пачку из очереди. Недоступность базы - повтор с паузой, не больше max_deliveries попыток."""
+        for attempt in range(1, self._max_deliveries + 1):
+            try:
+                await self._write_rows(batch)
+                return
+            except Exception:
+                self.metrics.errors += 1
+                if attempt == self._max_deliveries:
+                    logger.exception("history batch of %s rows lost after %s attempts", len(batch), attempt)
+                    return
+                logger.exception("history batch of %s rows not written, retrying", len(batch))
+                await asyncio.sleep(attempt)
+
+    async def _consume_stream(self, client: Redis) -> None:
+        block_ms = int(self._flush_interval * 1000)
+        while True:
+            try:
+                claimed = await client.xautoclaim(
+                    HISTORY_STREAM, HISTORY_GROUP, self._consumer, HISTORY_CLAIM_IDLE_MS, count=self._batch_size
+                )
+                if claimed[1]:
+                    messages = await self._move_dead(client, claimed[1])
+                else:
+                    response = await client.xreadgroup(
+                        HISTORY_GROUP, self._consumer, {HISTORY_STREAM: ">"}, count=self._batch_size, block=block_ms
+                    )
+                    messages = response[0][1] if response else []
+                if messages:
+                    await self._write_messages(client, messages)
+            except Exception:
+                # INFO Redis или Postgres недоступны: сообщения остаются в pending и будут прочитаны повторно
+                self.metrics.errors += 1
+                logger.exception("history stream consumer error")
+                await asyncio.sleep(1)
+
+    async def _write_messages(self, client: Redis, messages: list) -> None:
+        """Записать пачку и подтвердить записанное. Отвергнутое базой остается в pending до переноса
+        в HISTORY_DEAD_STREAM."""
+        rejected = await self._write_rows([self._decode(fields) for _, fields in messages])
+        written = [message_id for index, (message_id, _) in enumerate(messages) if index not in rejected]
+        if written:
+            await client.xack(HISTORY_STREAM, HISTORY_GROUP, *written)
+            await client.xdel(HISTORY_STREAM, *written)
+
+    async def _move_dead(self, client: Redis, messages: list) -> list:
+        """Забранные повторно сообщения без тех, что доставлялись больше max_deliveries раз: те переносятся
+        в HISTORY_DEAD_STREAM (для разбора вручную) и удаляются из потока."""
+        ids = [message_id for message_id, _ in messages]
+        pending = await client.xpending_range(
+            HISTORY_STREAM, HISTORY_GROUP, min=ids[0], max=ids[-1], count=len(ids), consumername=self._consumer
+        )
+        deliveries = {item["message_id"]: item["times_delivered"] for item in pending}
+        dead = [message for message in messages if deliveries.get(message[0], 0) > self._max_deliveries]
+        if not dead:
+            return messages
+        dead_ids = [message_id for message_id, _ in dead]
+        async with client.pipeline(transaction=True) as pipe:
+            for _, fields in dead:
+                pipe.xadd(HISTORY_DEAD_STREAM, fields)
+            pipe.xack(HISTORY_STREAM, HISTORY_GROUP, *dead_ids)
+            pipe.xdel(HISTORY_STREAM, *dead_ids)
+            await pipe.execute()
+        self.metrics.dead += len(dead)
+        logger.error("%s history messages moved to %s", len(dead), HISTORY_DEAD_STREAM)
+        return [message for message in messages if message[0] not in dead_ids]
+
+    async def _write_rows(self, connections: list[dict]) -> set[int]:
+        """Записать пачку; вернуть номера строк, отвергнутых базой. Прочие ошибки (база недоступна) пробрасываются."""
+        try:
+            await self._write(connections)
+            return set()
+        except (IntegrityError, DataError):
+            if len(connections) == 1:
+                self.metrics.errors += 1
+                logger.exception("history row for user %s rejected", connections[0]["user_id"])
+                return {0}
+            logger.exception("history batch rejected, writing %s rows one by one", len(connections))
+        rejected = set()
+        for index, connection in enumerate(connections):
+            try:
+                await self._write([connection])
+            except (IntegrityError, DataError):
+                self.metrics.errors += 1
+                rejected.add(index)
+                logger.exception("history row for user %s rejected", connection["user_id"])
+        return rejected
+
+    async def _write(self, connections: list[dict]) -> None:
+        async with get_db_session_for_main() as session:
+            await UserRepository(User, session).add_history_batch(connections)
+        self.metrics.batches += 1
+        self.metrics.written += len(connections)
+
+    @staticmethod
+    def _encode(connection: dict) -> dict[str, str]:
+        return {
+            "pk": str(connection["pk"]),
+            "user_id": str(connection["user_id"]),
+            "info": connection["info"] or "",
+            "created_at": connection["created_at"].isoformat(),
+        }
+
+    @staticmethod
+    def _decode(fields: dict[bytes, bytes]) -> dict[str, Any]:
+        fields = {key.decode(): value.decode() for key, value in fields.items()}
+        return {
+            "pk": uuid.UUID(fields["pk"]),
+            "user_id": uuid.UUID(fields["user_id"]),
+            "info": fields["info"],
+            "created_at": datetime.fromisoformat(fields["created_at"]),
+        }
+
+    def get_metrics(self) -> dict[str, Any]:
+        return {**asdict(self.metrics), "mode": self._mode, "pending": self._queue.qsize()}
+
+
+history_writer = HistoryWriter(
+    mode=settings.HISTORY_WRITER_MODE,
+    batch_size=settings.HISTORY_WRITER_BATCH_SIZE,
+    flush_interval=settings.HISTORY_WRITER_FLUSH_INTERVAL,
+    queue_size=settings.HISTORY_WRITER_QUEUE_SIZE,
+    max_deliveries=settings.HISTORY_WRITER_MAX_DELIVERIES,
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import UUID, Column, ForeignKey, String, Table, Text
+from sqlalchemy import UUID, Column, ForeignKey, Integer, String, Table, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from auth_service.src.database.models.base import Base
@@ -9,6 +9,8 @@ association_table = Table(
     Base.metadata,
     Column('role_pk', UUID, ForeignKey('roles.pk')),
     Column('permission_pk', UUID, ForeignKey('permissions.pk')),
+    # INFO без дублей: массовая выдача прав идет через INSERT ... ON CONFLICT DO NOTHING
+    UniqueConstraint('role_pk', 'permission_pk', name='roles_permissions_role_pk_permission_pk_key'),
 )
 
 
@@ -17,7 +19,9 @@ class Role(Base):
 
     name = Column(String(255), unique=True, nullable=False)
     permissions = relationship("Permission", lazy="selectin", secondary=association_table)
-    users = relationship("User", back_populates="role", cascade="all, delete-orphan", lazy="selectin")
+    users = relationship("User", back_populates="role", cascade="all, delete-orphan", lazy="raise")
+    # INFO увеличивается при изменении прав роли; токен хранит версию роли на момент выпуска (claim rv)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     def __init__(self, name: str) -> None:
         self.name = name
@@ -29,3 +33,5 @@ class Role(Base):
 class Permission(Base):
     __tablename__ = "permissions"
     allowed = Column(Text, unique=True)  # endpoints api   microservice_name/endpoint
+    # INFO номер бита права в bitset токена (claim perms). Не меняется и не переиспользуется
+    index = Column(Integer, unique=True, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Index, String, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -14,11 +14,12 @@ class User(Base):
     is_active = Column(Boolean, default=False)
     invalid_token = Column(Boolean, default=False)
     # INFO 1toM связь, тк M2M требует создания промежуточной таблицы прямо здесь в файле.
-    sessions = relationship("UserSessionLog", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
-    tokens = relationship("Token", back_populates="user", cascade="all, delete-orphan", lazy="selectin")
+    # INFO связи не грузятся автоматически (lazy="raise"): нужные подгружаются явно через options() в репозитории
+    sessions = relationship("UserSessionLog", back_populates="user", cascade="all, delete-orphan", lazy="raise")
+    tokens = relationship("Token", back_populates="user", cascade="all, delete-orphan", lazy="raise")
 
     role_id = Column(UUID, ForeignKey("roles.pk"))
-    role = relationship("Role", back_populates="users", lazy="selectin")
+    role = relationship("Role", back_populates="users", lazy="raise")
 
     def __init__(self, login: str, password: str) -> None:
         self.login = login
@@ -30,15 +31,22 @@ class User(Base):
 
 class UserSessionLog(Base):
     __tablename__ = 'sessions'
+    # INFO индекс под keyset-пагинацию истории входов: WHERE user_id = ? ORDER BY created_at DESC, pk DESC
+    __table_args__ = (Index('ix_sessions_user_id_created_at', 'user_id', 'created_at'),)
 
     info = Column(String(200))
     user_id = Column(UUID, ForeignKey("users.pk"))
-    user = relationship("User", back_populates="sessions", lazy="selectin")
+    user = relationship("User", back_populates="sessions", lazy="raise")
 
 
 class Token(Base):
+    """Действующий refresh token устройства пользователя. Хранится только sha256 токена."""
+
     __tablename__ = 'tokens'
+    # INFO одна запись на устройство: ротация - UPDATE ... WHERE user_id, device_id, token_hash
+    __table_args__ = (UniqueConstraint('user_id', 'device_id', name='tokens_user_id_device_id_key'),)
 
-    refresh_token = Column(Text)
-    user_id = Column(UUID, ForeignKey("users.pk"))
-    user = relationship("User", back_populates="tokens", lazy="selectin")
+    device_id = Column(String(64), nullable=False)
+    token_hash = Column(String(64), nullable=False)
+    user_id = Column(UUID, ForeignKey("users.pk"), nullable=False)
+    user = relationship("User", back_populates="tokens", lazy="raise")
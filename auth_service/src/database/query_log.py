@@ -0,0 +1,124 @@
+import functools
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_CAST = re.compile(r"::\w+(\[\])?")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|\b\d+\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Запрос без значений: одинаковые запросы с разными параметрами (N+1) дают один отпечаток."""
+    statement = _STRING.sub("?", statement)
+    statement = _CAST.sub("", statement)
+    statement = _PARAM.sub("?", statement)
+    statement = _LIST.sub("(...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+@dataclass
+class QueryLog:
+    statements: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def duplicates(self) -> dict[str, int]:
+        """Отпечатки, выполненные больше одного раза, - кандидаты в N+1."""
+        counts = Counter(fingerprint(statement) for statement in self.statements)
+        return {statement: count for statement, count in counts.most_common() if count > 1}
+
+    def report(self) -> str:
+        lines = [f"{len(self)} statements"]
+        lines += [f"  {count} x {statement}" for statement, count in self.duplicates().items()]
+        return "\n".join(lines)
+
+
+# INFO стек журналов: вложенные захваты (тест и запрос внутри него через ASGITransport) видят все запросы
+_logs: ContextVar[tuple[QueryLog, ...]] = ContextVar("query_logs", default=())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    for log in _logs.get():
+        log.statements.append(statement)
+
+
+def track_statements(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryLog]:
+    """SQL-запросы, выполненные в текущем контексте (задаче) до выхода из блока."""
+    log = QueryLog()
+    token = _logs.set((*_logs.get(), log))
+    try:
+        yield log
+    finally:
+        _logs.reset(token)
+
+
+class max_queries:
+    """Проверка бюджета SQL-запросов в тестах: контекстный менеджер или декоратор async-теста.
+
+        with max_queries(1):
+            await app_client.get('/api/v1/auth/me/')
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._capture = None
+
+    def __enter__(self) -> QueryLog:
+        self._capture = capture_queries()
+        self.log = self._capture.__enter__()
+        return self.log
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._capture.__exit__(*exc_info)
+        if exc_info[0] is None and len(self.log) > self.limit:
+            raise AssertionError(f"SQL budget {self.limit} exceeded: {self.log.report()}")
+
+    def __call__(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with max_queries(self.limit):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+
+class QueryBudgetMiddleware:
+    """Staging: запросы, превысившие бюджет SQL, пишутся в лог с маршрутом и повторяющимися отпечатками."""
+
+    def __init__(self, app: ASGIApp, budget: int, routes: dict[str, int] | None = None) -> None:
+        self.app = app
+        self.budget = budget
+        self.routes = routes or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with capture_queries() as log:
+            await self.app(scope, receive, send)
+
+        route = scope.get("route")
+        template = route.path if route is not None else scope["path"]
+        budget = self.routes.get(template, self.budget)
+        if len(log) > budget:
+            logger.warning("SQL budget %s exceeded by %s %s: %s", budget, scope["method"], template, log.report())
@@ -2,6 +2,17 @@ from typing import Optional
 
 from redis.asyncio import Redis
 
+from auth_service.src.core.metrics import track
+
+
+class InstrumentedRedis(Redis):
+    """Redis, который учитывает время команд в метриках текущего запроса."""
+
+    async def execute_command(self, *args, **options):
+        with track("redis"):
+            return await super().execute_command(*args, **options)
+
+
 redis: Optional[Redis] = None
 
 
@@ -2,6 +2,7 @@ import uuid
 from typing import Any, Dict, Generic, TypeVar
 
 from sqlalchemy import BinaryExpression, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth_service.src.database.models.base import Base
@@ -49,3 +50,9 @@ class DatabaseRepository(Generic[Model]):
         if expressions:
             query = query.where(*expressions)
         return list(await self.session.scalars(query))
+
+    def _insert(self, table):
+        # INFO ON CONFLICT есть только в диалектных insert()
+        if self.session.get_bind().dialect.name == 'sqlite':
+            return sqlite.insert(table)
+        return postgresql.insert(table)
@@ -1,12 +1,13 @@
 import uuid
 from collections.abc import Callable
-from typing import List
+from typing import List, Sequence
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from auth_service.src.database.models.role import Permission, Role
+from auth_service.src.database.models.role import Permission, Role, association_table
 from auth_service.src.database.models.user import User
 from auth_service.src.database.repository.base import DatabaseRepository
 from auth_service.src.database.session import get_db_session
@@ -20,7 +21,7 @@ class RoleRepository(DatabaseRepository):
         return rows.scalar_one_or_none()
 
     async def get_all(self) -> Role | None:
-        query = select(self.model).limit(100)
+        query = select(self.model).options(selectinload(self.model.users)).limit(100)
         rows = list(await self.session.scalars(query))
         return rows
 
@@ -46,7 +47,9 @@ class RoleRepository(DatabaseRepository):
         return role_db
 
     async def delete(self, pk: uuid.UUID) -> int:
-        result = await self.session.execute(select(self.model).where(self.model.pk == pk))
+        # INFO users нужны для cascade delete
+        query = select(self.model).where(self.model.pk == pk).options(selectinload(self.model.users))
+        result = await self.session.execute(query)
         role_to_delete = result.first()
 
         if role_to_delete:
@@ -80,29 +83,68 @@ class RoleRepository(DatabaseRepository):
 
         db_permissions = await self.get_permissions()
         allowed_in_db = [permission.allowed for permission in db_permissions]
+        next_index = max((permission.index for permission in db_permissions), default=-1) + 1
 
         has_new_urls = False
         for url in endpoints:
             url = url['path']
             if url not in allowed_in_db:
                 has_new_urls = True
-                self.session.add(Permission(allowed=url))
+                allowed_in_db.append(url)
+                self.session.add(Permission(allowed=url, index=next_index))
+                next_index += 1
         if has_new_urls:
             await self.session.commit()
         return endpoints
 
-    async def set_permission_to_role(self, role: Role, permissions: List[str]):
-        for permission in permissions:
-            query = select(Permission).where(Permission.allowed == permission)
-            rows = await self.session.execute(query)
-            perm = rows.scalar_one_or_none()
-            if perm:
-                role.permissions.append(perm)
+    async def get_role_permissions(self, role_pk: uuid.UUID) -> set[str]:
+        query = (
+            select(Permission.allowed)
+            .join(association_table, association_table.c.permission_pk == Permission.pk)
+            .where(association_table.c.role_pk == role_pk)
+        )
+        return set(await self.session.scalars(query))
 
-            await self.session.commit()
-            await self.session.refresh(role)
+    async def set_permission_to_role(self, role: Role, permissions: List[str]):
+        await self.change_role_permissions(role, grant=permissions)
         return True
 
+    async def change_role_permissions(
+        self, role: Role, grant: Sequence[str] = (), revoke: Sequence[str] = ()
+    ) -> tuple[int, int]:
+        """Выдать и отозвать права роли в одной транзакции, не загружая права и пользователей роли.
+
+        Возвращает (добавлено, удалено). Неизвестные права пропускаются.
+        """
+        added = removed = 0
+        if grant:
+            permission_pks = select(Permission.pk).where(Permission.allowed.in_(set(grant)))
+            rows = [{"role_pk": role.pk, "permission_pk": pk} for pk in await self.session.scalars(permission_pks)]
+            if rows:
+                result = await self.session.execute(
+                    self._insert(association_table).values(rows).on_conflict_do_nothing()
+                )
+                added = result.rowcount
+        if revoke:
+            result = await self.session.execute(
+                delete(association_table).where(
+                    association_table.c.role_pk == role.pk,
+                    association_table.c.permission_pk.in_(
+                        select(Permission.pk).where(Permission.allowed.in_(set(revoke)))
+                    ),
+                )
+            )
+            removed = result.rowcount
+
+        if added or removed:
+            await self.session.execute(
+                update(Role).where(Role.pk == role.pk).values(version=Role.version + 1)
+            )
+        await self.session.commit()
+        await self.session.refresh(role, attribute_names=['permissions', 'version'])
+
+        return added, removed
+
 
 def get_role_repository(
     model: type[Role],
@@ -4,61 +4,110 @@ from typing import List
 from uuid import UUID
 
 from fastapi import Depends
-from sqlalchemy import select, update
+from sqlalchemy import delete, func, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.base import ExecutableOption
 
 from auth_service.src.database.models.role import Role
 from auth_service.src.database.models.user import Token, User, UserSessionLog
 from auth_service.src.database.repository.base import DatabaseRepository
 from auth_service.src.database.session import get_db_session
+from auth_service.src.dto.user import UserPrincipalDTO
+
+# INFO опции загрузки связей User (по умолчанию связи не грузятся, см. models/user.py)
+WITH_ROLE_PERMISSIONS = selectinload(User.role).selectinload(Role.permissions)
+WITH_HISTORY = selectinload(User.sessions)
 
 
 class UserRepository(DatabaseRepository):
 
-    async def find_by_login(self, login: str) -> User | None:
-        query = select(self.model).where(self.model.login == login)
+    async def find_by_login(self, login: str, *options: ExecutableOption) -> User | None:
+        query = select(self.model).where(self.model.login == login).options(*options)
         rows = await self.session.execute(query)
         return rows.scalar_one_or_none()
 
-    async def add_to_history(self, user: User, user_agent: str):
-        connection = UserSessionLog(info=user_agent, user_id=user.pk)
-        self.session.add(connection)
+    async def find_principal(self, login: str) -> UserPrincipalDTO | None:
+        """Один SELECT только нужных для авторизации колонок, без ORM-объекта и связей."""
+        query = select(
+            self.model.pk,
+            self.model.login,
+            self.model.is_active,
+            self.model.invalid_token,
+            self.model.role_id,
+        ).where(self.model.login == login)
+        row = (await self.session.execute(query)).one_or_none()
+        return UserPrincipalDTO.model_validate(row) if row else None
+
+    async def get_logins_page(self, limit: int, after: str | None = None) -> List[str]:
+        """Страница логинов по возрастанию, начиная после after (keyset по уникальному индексу login)."""
+        query = select(self.model.login)
+        if after is not None:
+            query = query.where(self.model.login > after)
+        return list(await self.session.scalars(query.order_by(self.model.login).limit(limit)))
+
+    async def add_history_batch(self, connections: List[dict]) -> None:
+        """Записать пачку входов одним multi-row INSERT. Повторная запись той же пачки ничего не меняет (по pk)."""
+        query = self._insert(UserSessionLog).on_conflict_do_nothing(index_elements=[UserSessionLog.pk])
+        await self.session.execute(query, connections)
         await self.session.commit()
-        await self.session.refresh(user)  # INFO важно обновить user, чтобы его актуальные данные подтянуть в DTO
 
-    async def find_refresh_token(self, user: User):
-        query = select(Token).where(Token.user_id == user.pk)
-        rows = await self.session.execute(query)
-        return rows.scalar_one_or_none()
+    async def get_history_page(
+        self, user_id: UUID, limit: int, after: tuple[datetime, UUID] | None = None
+    ) -> List[UserSessionLog]:
+        """Страница истории входов от новых к старым, начиная после записи (created_at, pk)."""
+        query = select(UserSessionLog).where(UserSessionLog.user_id == user_id)
+        if after:
+            query = query.where(tuple_(UserSessionLog.created_at, UserSessionLog.pk) < tuple_(*after))
+        query = query.order_by(UserSessionLog.created_at.desc(), UserSessionLog.pk.desc()).limit(limit)
+        return list(await self.session.scalars(query))
 
-    async def update_refresh_token(self, token_db: Token, refresh_token:str):
-        query = (
-            update(Token)
-            .where(Token.refresh_token == token_db.refresh_token)
-            .values(refresh_token=refresh_token, updated_at=datetime.now())
+    async def store_refresh_token(self, user_id: UUID, device_id: str, token_hash: str) -> None:
+        """Сохранить refresh token устройства (вход, перевыпуск токенов без ротации)."""
+        query = self._insert(Token).values(user_id=user_id, device_id=device_id, token_hash=token_hash)
+        query = query.on_conflict_do_update(
+            index_elements=[Token.user_id, Token.device_id],
+            set_={'token_hash': query.excluded.token_hash, 'updated_at': func.now()},
         )
         await self.session.execute(query)
+        await self.session.commit()
 
-    async def set_or_update_refresh_token(self, user: User, refresh_token: str):
-        token_db = await self.find_refresh_token(user)
-        if token_db:
-            await self.update_refresh_token(token_db, refresh_token )
-            return refresh_token
-
-        token = Token(refresh_token=refresh_token, user_id=user.pk)
-        self.session.add(token)
+    async def rotate_refresh_token(self, user_id: UUID, device_id: str, old_hash: str, new_hash: str) -> bool:
+        """Заменить refresh token устройства, только если предъявлен текущий (compare-and-swap одним UPDATE)."""
+        query = (
+            update(Token)
+            .where(Token.user_id == user_id, Token.device_id == device_id, Token.token_hash == old_hash)
+            .values(token_hash=new_hash, updated_at=func.now())
+            .returning(Token.pk)
+        )
+        rotated = (await self.session.execute(query)).scalar_one_or_none()
         await self.session.commit()
-        await self.session.refresh(user)
+        return rotated is not None
 
+    async def replace_password_hash(self, user_id: UUID, old_hash: str, new_hash: str) -> bool:
+        """Заменить хеш пароля, только если он не менялся (смена пароля, пока пересчитывался старый, не затирается)."""
+        query = (
+            update(self.model)
+            .where(self.model.pk == user_id, self.model.password == old_hash)
+            .values(password=new_hash)
+            .returning(self.model.pk)
+        )
+        replaced = (await self.session.execute(query)).scalar_one_or_none()
+        await self.session.commit()
+        return replaced is not None
 
-    async def invalidate_tokens(self, role:Role) -> None:
-        query = select(User).where(User.role == role)
-        users = list(await self.session.scalars(query))
-        if users:
-            for user in users:
-                user.invalid_token = True
-                self.session.add(user)
+    async def delete_refresh_tokens(
+        self, login: str, device_id: str | None = None, keep_device_id: str | None = None
+    ) -> int:
+        """Удалить refresh token устройства (или всех устройств, кроме keep_device_id). Возвращает число записей."""
+        query = delete(Token).where(Token.user_id == select(User.pk).where(User.login == login).scalar_subquery())
+        if device_id is not None:
+            query = query.where(Token.device_id == device_id)
+        if keep_device_id is not None:
+            query = query.where(Token.device_id != keep_device_id)
+        result = await self.session.execute(query)
         await self.session.commit()
+        return result.rowcount
 
 def get_user_repository(
     model: type[User],
@@ -1,15 +1,122 @@
+import time
 from collections.abc import AsyncGenerator
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
 
 from fastapi.concurrency import asynccontextmanager
-from sqlalchemy import exc
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import exc, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from auth_service.src.core.config import settings
+from auth_service.src.core.metrics import instrument_engine
+from auth_service.src.database.query_log import track_statements
+
+
+@dataclass
+class PoolMetrics:
+    """Счетчики выдачи соединений из пула (на один воркер gunicorn)."""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool, который замеряет время ожидания свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.observe_wait(time.perf_counter() - started)
+
+
+# INFO один engine (и один пул соединений) на процесс. Создается в main.lifespan,
+# т.е. после форка каждого воркера gunicorn, поэтому соединения не делятся между процессами.
+engine: Optional[AsyncEngine] = None
+session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def create_engine(dsn: str) -> AsyncEngine:
+    """Engine по DSN: postgresql+asyncpg в работе, sqlite+aiosqlite (файл) - тесты и бенчмарки без Postgres."""
+    options = {}
+    if make_url(dsn).get_backend_name() == 'sqlite':
+        # INFO запись в SQLite последовательная: соединение ждет блокировку файла, а не падает через 5 с
+        options['connect_args'] = {'timeout': settings.POSTGRES_POOL_TIMEOUT}
+    return create_async_engine(
+        dsn,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.POSTGRES_POOL_SIZE,
+        max_overflow=settings.POSTGRES_MAX_OVERFLOW,
+        pool_timeout=settings.POSTGRES_POOL_TIMEOUT,
+        pool_pre_ping=settings.POSTGRES_POOL_PRE_PING,
+        pool_recycle=settings.POSTGRES_POOL_RECYCLE,
+        **options,
+    )
+
+
+async def create_sqlite_schema() -> None:
+    """Схема для SQLite по моделям. В Postgres схему создают миграции alembic."""
+    from auth_service.src.database.models import role, user  # noqa: F401 регистрация таблиц в metadata
+    from auth_service.src.database.models.base import Base
+
+    async with init_engine().begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+
+def init_engine() -> AsyncEngine:
+    global engine, session_factory
+
+    if engine is None:
+        engine = create_engine(settings.POSTGRES_DSN)
+        instrument_engine(engine)
+        track_statements(engine)
+        # INFO expire_on_commit=False: после commit объекты не истекают, иначе обращение к атрибуту
+        # в async коде делает неявный SELECT (MissingGreenlet). Актуальные данные подтягиваются через refresh()
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    return engine
+
+
+async def dispose_engine() -> None:
+    global engine, session_factory
+
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    session_factory = None
+
+
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    # INFO вне lifespan (например, createsuperuser.py) engine создается лениво при первом обращении
+    if session_factory is None:
+        init_engine()
+    return session_factory
+
+
+def get_pool_metrics() -> dict[str, Any]:
+    metrics = asdict(pool_metrics)
+    if engine is not None:
+        pool = engine.pool
+        metrics.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return metrics
 
 
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
-    engine = create_async_engine(settings.POSTGRES_DSN)
-    factory = async_sessionmaker(engine)
+    factory = get_session_factory()
     async with factory() as session:
         try:
             yield session
@@ -21,8 +128,7 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
 
 @asynccontextmanager
 async def get_db_session_for_main() -> AsyncGenerator[AsyncSession, None]:
-    engine = create_async_engine(settings.POSTGRES_DSN)
-    factory = async_sessionmaker(engine)
+    factory = get_session_factory()
     async with factory() as session:
         try:
             yield session
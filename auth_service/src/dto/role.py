@@ -1,8 +1,8 @@
 import uuid
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
-from auth_service.src.dto.user import UserDTO
+from auth_service.src.dto.user import UserShortDTO
 
 
 class RoleCreateDTO(BaseModel):
@@ -23,7 +23,7 @@ class RoleUsersDTO(BaseModel):
     pk: uuid.UUID
     name: str
     permissions: list[PermissionDTO] = []
-    users: list[UserDTO]
+    users: list[UserShortDTO]
 
 
 class RoleDTO(BaseModel):
@@ -31,3 +31,19 @@ class RoleDTO(BaseModel):
 
     pk: uuid.UUID
     name: str
+
+
+class PermissionsCheckDTO(BaseModel):
+    # эндпоинты или метки ресурсов, добавленные как права роли
+    endpoints: list[str] = Field(min_length=1, max_length=1000)
+
+
+class PermissionsCheckResultDTO(BaseModel):
+    allowed: dict[str, bool]
+    # '1'/'0' для каждого элемента запроса в исходном порядке
+    bitmap: str
+
+
+class RolePermissionsChangeDTO(BaseModel):
+    added: int
+    removed: int
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class ProfilerArmDTO(BaseModel):
+    """Профилировать следующие count запросов к маршруту route (шаблон, как в правах) и/или с заголовком header."""
+
+    route: str | None = None
+    header: str | None = None
+    count: int = Field(default=10, ge=1, le=100)
+    ttl: int = Field(default=600, ge=1, le=3600, description='Сколько секунд действует заявка')
+
+    @model_validator(mode='after')
+    def check_filter(self) -> 'ProfilerArmDTO':
+        if not self.route and not self.header:
+            raise ValueError('Нужно указать route или header')
+        return self
+
+
+class ProfilerArmedDTO(BaseModel):
+    id: str
+    count: int
+    expires_at: float
+    route: str | None = None
+    header: str | None = None
+
+
+class ProfileFileDTO(BaseModel):
+    name: str
+    size: int
+    created_at: datetime
@@ -1,4 +1,5 @@
 import uuid
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel, ConfigDict
@@ -29,6 +30,32 @@ class UserSessionLogDTO(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
     info: str
+    created_at: datetime | None = None
+
+
+class UserHistoryPageDTO(BaseModel):
+    items: list[UserSessionLogDTO]
+    # INFO непрозрачный курсор следующей страницы, None - страниц больше нет
+    next_cursor: str | None = None
+
+
+class UserShortDTO(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    pk: uuid.UUID
+    login: str
+
+
+class UserPrincipalDTO(BaseModel):
+    """Минимальный набор полей пользователя, достаточный для авторизации запроса."""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    pk: uuid.UUID
+    login: str
+    is_active: bool | None = None
+    invalid_token: bool | None = None
+    role_id: uuid.UUID | None = None
 
 
 class UserDTO(BaseModel):
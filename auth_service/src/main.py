@@ -1,3 +1,6 @@
+import asyncio
+import hashlib
+import json
 import logging
 from logging import getLogger
 
@@ -5,43 +8,61 @@ from fastapi import FastAPI, Request, Response
 from fastapi.concurrency import asynccontextmanager
 from fastapi.responses import ORJSONResponse
 from fastapi.routing import APIRoute
-from redis.asyncio import Redis
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.routing import Route
 
-from auth_service.src.api.v1 import auth, role, user
+from auth_service.src.api import well_known
+from auth_service.src.api.v1 import auth, role, service, user
 from auth_service.src.cache.cache import get_cache_storage
+from auth_service.src.cache.login_filter import login_filter
+from auth_service.src.cache.role_versions import role_versions
 from auth_service.src.core.config import settings
+from auth_service.src.core.metrics import METRICS_PATH, MetricsMiddleware, metrics_endpoint
+from auth_service.src.core.profiling import ProfilerMiddleware, request_profiler
 from auth_service.src.database import redis
-from auth_service.src.database.models.role import Permission, Role
+from auth_service.src.database.history_writer import history_writer
+from auth_service.src.database.models.role import Role
 from auth_service.src.database.models.user import User
+from auth_service.src.database.query_log import QueryBudgetMiddleware
 from auth_service.src.database.repository.role import RoleRepository
 from auth_service.src.database.repository.user import UserRepository
-from auth_service.src.database.session import get_db_session_for_main
+from auth_service.src.database.session import (
+    create_sqlite_schema,
+    dispose_engine,
+    get_db_session_for_main,
+    init_engine,
+)
 from auth_service.src.dto.user import UserCredentialsDTO
+from auth_service.src.security.hashing import password_hasher
 from auth_service.src.security.JWTAuth import JWTAuth, JWTConfig
-from auth_service.src.services.auth import AuthService
+from auth_service.src.security.matcher import route_resolver
+from auth_service.src.security.permissions import permission_registry
+from auth_service.src.services.auth import AuthService, wait_rehash_tasks
 from auth_service.src.services.role import RoleService
 
 logging.basicConfig(level=logging.INFO)
 logger = getLogger(__name__)
 
+BOOTSTRAP_VERSION_KEY = "auth:bootstrap_version"
+# INFO ключ pg_advisory_lock: bootstrap выполняет только один процесс, остальные ждут
+BOOTSTRAP_LOCK_ID = 72_2024_1018
+
+BASIC_USER_PERMISSIONS = [
+    "/api/v1/auth/refresh/",
+    "/api/v1/auth/register",
+    "/api/v1/auth/login",
+    "/api/v1/auth/logout",
+    "/api/v1/auth/logout-other-devices",
+    "/api/v1/auth/me/",
+]
+
 
 async def add_permissions_in_db(_: FastAPI, session: AsyncSession):
     # TODO add prefix service in endpoint url  auth_service_/api/v1/create-user
     api_url_list = [{"path": route.path, "name": route.name} for route in app.routes if isinstance(route, APIRoute)]
     repo = RoleRepository(Role, session)
-    db_permissions = await repo.get_permissions()
-    allowed_in_db = [permission.allowed for permission in db_permissions]
-
-    has_new_urls = False
-    for url in api_url_list:
-        url = url['path']
-        if url not in allowed_in_db:
-            has_new_urls = True
-            session.add(Permission(allowed=url))
-    if has_new_urls:
-        await session.commit()
-    return api_url_list
+    return await repo.add_permissions(endpoints=api_url_list)
 
 
 async def create_superuser_with_role(session: AsyncSession, login: str):
@@ -94,16 +115,9 @@ async def create_basic_role(session: AsyncSession):
     permissions = await role_service.repository.get_permissions()
     if not permissions:
         raise RuntimeError("Не созданы права доступа для ролей")
-    user_permissions = [
-        "/api/v1/auth/refresh/",
-        "/api/v1/auth/register",
-        "/api/v1/auth/login",
-        "/api/v1/auth/logout",
-        "/api/v1/auth/me/",
-    ]
     correct_user_permissions = []
     for permission in permissions:
-        for user_permission in user_permissions:
+        for user_permission in BASIC_USER_PERMISSIONS:
             if permission.allowed == user_permission:
                 correct_user_permissions.append(permission.allowed)
                 break
@@ -115,21 +129,99 @@ async def create_basic_role(session: AsyncSession):
     await role_service.repository.set_permission_to_role(user_role, correct_user_permissions)
 
 
+def get_bootstrap_version() -> str:
+    """Версия bootstrap меняется вместе с маршрутами (правами), правами базовой роли и логином админа."""
+    routes = sorted(route.path for route in app.routes if isinstance(route, APIRoute))
+    raw = json.dumps([routes, BASIC_USER_PERMISSIONS, settings.ADMIN_LOGIN])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+@asynccontextmanager
+async def bootstrap_lock():
+    engine = init_engine()
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    # INFO отдельное соединение: блокировка уровня сессии переживает commit-ы внутри bootstrap
+    async with engine.connect() as connection:
+        await connection.execute(text('SELECT pg_advisory_lock(:lock_id)'), {'lock_id': BOOTSTRAP_LOCK_ID})
+        try:
+            yield
+        finally:
+            await connection.execute(text('SELECT pg_advisory_unlock(:lock_id)'), {'lock_id': BOOTSTRAP_LOCK_ID})
+
+
+async def run_bootstrap(force: bool = False) -> bool:
+    """Права, суперпользователь и базовые роли. Возвращает False, если эта версия уже применена.
+
+    Идемпотентно: повторный запуск ничего не дублирует. Параллельные запуски ждут advisory lock,
+    после чего видят записанную версию и выходят.
+    """
+    version = get_bootstrap_version()
+    cache = await get_cache_storage()
+
+    async def is_applied() -> bool:
+        applied = await cache.get_cache(BOOTSTRAP_VERSION_KEY)
+        return not force and applied is not None and applied.decode() == version
+
+    if await is_applied():
+        return False
+    async with bootstrap_lock():
+        if await is_applied():
+            return False
+        async with get_db_session_for_main() as session:
+            # Добавляем права в базу данных
+            await add_permissions_in_db(app, session)
+            logger.info("permissions added successfully")
+            await create_superuser_with_role(session=session, login=settings.ADMIN_LOGIN)
+            await create_basic_role(session)
+            logger.info("Created basic roles and users")
+        await cache.set_cache(key=BOOTSTRAP_VERSION_KEY, value=version)
+    return True
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # TODO наличие соединения не проверяется
-    redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
-    logger.info("redis connection successfull")
-    async with get_db_session_for_main() as session:
-        # Добавляем права в базу данных
-        await add_permissions_in_db(app, session)
-        logger.info("permissions added successfully")
-        await create_superuser_with_role(session=session, login=settings.ADMIN_LOGIN)
-        await create_basic_role(session)
-        logger.info("Created basic roles and users")
+    if settings.CACHE_BACKEND == "redis":
+        # TODO наличие соединения не проверяется
+        redis.redis = redis.InstrumentedRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        logger.info("redis connection successfull")
+    if init_engine().dialect.name == "sqlite":
+        await create_sqlite_schema()
+    logger.info("postgres engine created")
+    password_hasher.start()
+    # INFO bootstrap выполняет `createsuperuser.py bootstrap` до запуска gunicorn (entrypoint_auth.sh),
+    # воркер только сверяет версию в Redis. Без этой команды (локальный запуск, тесты) bootstrap выполнит воркер
+    if await run_bootstrap():
+        logger.info("bootstrap done by worker")
+    # INFO фильтр логинов тоже собирает `createsuperuser.py bootstrap`; воркер достраивает его, только если ключа
+    # нет (Redis очищен, запуск без entrypoint). До готовности фильтр отвечает "возможно есть"
+    if await login_filter.rebuild(await get_cache_storage()):
+        logger.info("login filter built by worker")
+    await permission_registry.refresh()
+    # INFO все маршруты, а не только APIRoute: путь /metrics не должен совпасть с шаблоном-соседом из прав
+    route_resolver.load(route.path for route in app.routes if isinstance(route, Route))
+    logger.info("permission registry loaded")
+    # INFO без Redis (CACHE_BACKEND=memory) процесс один и слушать события других воркеров не нужно
+    listeners = []
+    if redis.redis:
+        # изменения ролей и заявки профилировщика, сделанные через другие воркеры
+        listeners.append(asyncio.create_task(role_versions.listen(redis.redis)))
+        listeners.append(asyncio.create_task(request_profiler.listen(redis.redis)))
+    await history_writer.start()
     yield
-    await redis.redis.close()
-    logger.info("redis disconnection successfull")
+    for listener in listeners:
+        listener.cancel()
+    await history_writer.shutdown()
+    logger.info("login history drained")
+    await wait_rehash_tasks()
+    await password_hasher.shutdown()
+    await dispose_engine()
+    logger.info("postgres engine disposed")
+    if redis.redis:
+        await redis.redis.close()
+        redis.redis = None
+        logger.info("redis disconnection successfull")
 
 
 app = FastAPI(
@@ -150,3 +242,13 @@ app = FastAPI(
 app.include_router(user.router, prefix="/api/v1/users")
 app.include_router(role.router, prefix="/api/v1/roles", tags=["roles"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
+app.include_router(service.router, prefix="/api/v1/service", tags=["service"])
+app.include_router(well_known.router, prefix="/.well-known")
+
+# INFO /metrics - маршрут Starlette, а не APIRoute: не попадает в права и в OpenAPI. Снаружи закрыт в nginx
+app.add_route(METRICS_PATH, metrics_endpoint, include_in_schema=False)
+# INFO профилировщик внутри MetricsMiddleware: его накладные расходы видны в латентности профилируемых запросов
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+if settings.QUERY_BUDGET:
+    app.add_middleware(QueryBudgetMiddleware, budget=settings.QUERY_BUDGET, routes=settings.QUERY_BUDGET_ROUTES)
@@ -1,14 +1,21 @@
+import hashlib
+import json
+import os
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from typing import Any
 
 import jwt
+from cryptography.hazmat.primitives import serialization
 from fastapi import HTTPException, Request, status
 
 from auth_service.src.core.config import settings
+from auth_service.src.core.metrics import track
+
+ISSUER = 'befunny@auth_service'
 
 
 class JWTError(Exception):
@@ -23,6 +30,20 @@ async def get_token(request: Request):
     return token
 
 
+async def get_token_or_bearer(request: Request):
+    """access token из cookie (браузер) или заголовка Authorization: Bearer (клиенты API за nginx)."""
+    token = request.cookies.get('user_access_token')
+    if not token:
+        scheme, _, credentials = request.headers.get('authorization', '').partition(' ')
+        token = credentials if scheme.lower() == 'bearer' else None
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail='Token not found', headers={'Cache-Control': 'no-store'}
+        )
+
+    return token
+
+
 async def get_refresh_token(request: Request):
     token = request.cookies.get('user_refresh_token')
     if not token:
@@ -37,6 +58,42 @@ class JWTConfig:
     algorithm: str = settings.JWT_ALGORITHM
     access_token_ttl: timedelta = settings.ACCESS_TOKEN_EXPIRE_MINUTES
     refresh_token_ttl: timedelta = settings.REFRESH_TOKEN_EXPIRE_MINUTES
+    # INFO для RS256/EdDSA: каталог приватных ключей {kid}.pem и kid ключа для подписи (по умолчанию - последний)
+    keys_dir: str | None = settings.JWT_KEYS_DIR
+    active_kid: str | None = settings.JWT_ACTIVE_KID
+
+    @property
+    def is_asymmetric(self) -> bool:
+        return not self.algorithm.startswith('HS')
+
+
+@dataclass
+class KeyRing:
+    """Ключи асимметричной подписи. Подписывает активный ключ, проверяются все (ротация по kid)."""
+
+    active_kid: str
+    private_keys: dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, keys_dir: str, active_kid: str | None = None) -> 'KeyRing':
+        private_keys = {}
+        for filename in sorted(os.listdir(keys_dir)):
+            kid, ext = os.path.splitext(filename)
+            if ext != '.pem':
+                continue
+            with open(os.path.join(keys_dir, filename), 'rb') as key_file:
+                private_keys[kid] = serialization.load_pem_private_key(key_file.read(), password=None)
+        if not private_keys:
+            raise JWTError(f'В каталоге {keys_dir} нет ключей подписи *.pem')
+
+        active_kid = active_kid or list(private_keys)[-1]
+        if active_kid not in private_keys:
+            raise JWTError(f'Ключ {active_kid} не найден в {keys_dir}')
+        return cls(active_kid=active_kid, private_keys=private_keys)
+
+    @cached_property
+    def public_keys(self) -> dict[str, Any]:
+        return {kid: key.public_key() for kid, key in self.private_keys.items()}
 
 
 class TokenType(str, Enum):
@@ -50,6 +107,7 @@ class JWTAuth:
 
     def __init__(self, config: JWTConfig):
         self._config = config
+        self._keyring = KeyRing.load(config.keys_dir, config.active_kid) if config.is_asymmetric else None
 
     def generate_unlimited_access_token(self, subject: str, payload: dict[str, Any] = {}) -> str:
         return self.__sign_token(type=TokenType.ACCESS.value, subject=subject, payload=payload)
@@ -75,7 +133,7 @@ class JWTAuth:
 
         data = dict(
             # Указываем себя в качестве издателя
-            iss='befunny@auth_service',
+            iss=ISSUER,
             # владелец токена (username or email)
             sub=subject,
             # тип токена - ACCESS or REFRESH
@@ -89,14 +147,44 @@ class JWTAuth:
         )
         data.update(dict(exp=data['nbf'] + ttl)) if ttl else None
         payload.update(data)
-        return jwt.encode(payload, self._config.secret, algorithm=self._config.algorithm)
+        with track('jwt'):
+            if self._keyring:
+                kid = self._keyring.active_kid
+                return jwt.encode(
+                    payload, self._keyring.private_keys[kid], algorithm=self._config.algorithm, headers={'kid': kid}
+                )
+            return jwt.encode(payload, self._config.secret, algorithm=self._config.algorithm)
 
     @staticmethod
     def __generate_jti() -> str:
         return str(uuid.uuid4())
 
     def verify_token(self, token) -> dict[str, Any]:
-        return jwt.decode(token, self._config.secret, algorithms=[self._config.algorithm])
+        with track('jwt'):
+            if self._keyring:
+                kid = jwt.get_unverified_header(token).get('kid')
+                key = self._keyring.public_keys.get(kid)
+                if key is None:
+                    raise jwt.InvalidKeyError(f'Unknown kid {kid}')
+                return jwt.decode(token, key, algorithms=[self._config.algorithm])
+            return jwt.decode(token, self._config.secret, algorithms=[self._config.algorithm])
+
+    @cached_property
+    def jwks(self) -> dict[str, Any]:
+        """Публичные ключи в формате JWKS. Для HMAC (HS*) список пуст - секрет не публикуется."""
+        if not self._keyring:
+            return {'keys': []}
+        algorithm = jwt.get_algorithm_by_name(self._config.algorithm)
+        keys = []
+        for kid, public_key in self._keyring.public_keys.items():
+            jwk = algorithm.to_jwk(public_key, as_dict=True)
+            jwk.update(kid=kid, use='sig', alg=self._config.algorithm)
+            keys.append(jwk)
+        return {'keys': keys}
+
+    @cached_property
+    def jwks_etag(self) -> str:
+        return hashlib.sha256(json.dumps(self.jwks, sort_keys=True).encode()).hexdigest()
 
     def get_jti(self, token) -> str:
         return self.verify_token(token)['jti']
@@ -0,0 +1,162 @@
+import asyncio
+import math
+import multiprocessing
+import secrets
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
+
+from auth_service.src.core.config import settings
+from auth_service.src.core.metrics import track
+
+# https://security.stackexchange.com/questions/4781/do-any-security-experts-recommend-bcrypt-for-password-storage/6415#6415
+# bcrypt vs pdkdf2 == все равно. оба хороши. Цель достигнуть 350мс на хеширование функции подбором раундов
+# (createsuperuser.py calibrate-hash пишет схему и раунды в настройки).
+PASSWORD_HASH_SCHEMES = ("pbkdf2_sha256", "bcrypt")
+
+
+def build_context(scheme: str, rounds: int) -> CryptContext:
+    """Хеши по scheme с ровно rounds раундами. Хеши по другим схемам и с другим числом раундов проверяются,
+    но needs_update() для них True - их пересчитывают при входе (deprecated='auto' - все схемы, кроме первой)."""
+    if scheme not in PASSWORD_HASH_SCHEMES:
+        raise ValueError(f"Неизвестная схема хеширования {scheme}, доступны {PASSWORD_HASH_SCHEMES}")
+    return CryptContext(
+        schemes=[scheme, *(other for other in PASSWORD_HASH_SCHEMES if other != scheme)],
+        deprecated="auto",
+        **{f"{scheme}__default_rounds": rounds, f"{scheme}__min_rounds": rounds, f"{scheme}__max_rounds": rounds},
+    )
+
+
+def calibrate(scheme: str, target: float, samples: int = 3) -> int:
+    """Число раундов scheme, при котором хеш на этой машине занимает около target секунд.
+
+    Время замеряется на раундах по умолчанию passlib и пересчитывается по модели стоимости схемы:
+    у pbkdf2 она линейна по раундам, у bcrypt раунды - log2 стоимости.
+    """
+    handler = get_crypt_handler(scheme)
+    base = handler.default_rounds
+    context = build_context(scheme, base)
+    seconds = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(secrets.token_urlsafe(16))
+        seconds = min(seconds, time.perf_counter() - started)
+    if handler.rounds_cost == "log2":
+        rounds = base + round(math.log2(target / seconds))
+    else:
+        # INFO круглое число раундов - настройку читает человек
+        rounds = round(base * target / seconds, -3)
+    return int(max(handler.min_rounds, min(handler.max_rounds, rounds)))
+
+
+pwd_context = build_context(settings.PASSWORD_HASH_SCHEME, settings.PASSWORD_HASH_ROUNDS)
+
+
+# INFO функции уровня модуля, чтобы их можно было передать в ProcessPoolExecutor (pickle)
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+@dataclass
+class HashingMetrics:
+    calls: int = 0
+    rejected: int = 0
+    # хеши, пересчитанные при входе под текущие схему и раунды
+    rehashed: int = 0
+    seconds_total: float = 0.0
+    seconds_max: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.calls += 1
+        self.seconds_total += seconds
+        self.seconds_max = max(self.seconds_max, seconds)
+
+
+class PasswordHasher:
+    """Выполняет хеширование паролей вне event loop в ограниченном пуле процессов или потоков.
+
+    Если в очереди уже max_pending задач, новый запрос сразу получает 503, а не ждет.
+    """
+
+    def __init__(self, executor_type: str, workers: int, max_pending: int) -> None:
+        self._executor_type = executor_type
+        self._workers = workers
+        self._max_pending = max_pending
+        self._executor: Executor | None = None
+        self._pending = 0
+        # хеш случайного пароля для verify_dummy, считается при первом вызове
+        self._dummy_hash: str | None = None
+        self.metrics = HashingMetrics()
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        if self._executor_type == "process":
+            # spawn, а не fork: воркер gunicorn уже держит event loop, потоки и соединения
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="password-hasher")
+
+    async def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            # INFO ожидание текущих задач пула блокирует - в потоке, чтобы не останавливать event loop
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, password, hashed_password)
+
+    @staticmethod
+    def needs_update(hashed_password: str) -> bool:
+        """Хеш по другой схеме или с другим числом раундов (только разбор строки, без хеширования)."""
+        return pwd_context.needs_update(hashed_password)
+
+    async def verify_dummy(self, password: str) -> None:
+        """Проверка против хеша случайного пароля: вход с несуществующим логином длится столько же,
+        сколько с неверным паролем, и не выдает по времени ответа, есть ли такой логин."""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash(secrets.token_urlsafe(16))
+        await self.verify(password, self._dummy_hash)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self._max_pending:
+            self.metrics.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Сервис перегружен, повторите запрос позже',
+                headers={"Retry-After": "1"},
+            )
+        self.start()
+
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            with track("hash"):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+            self.metrics.observe(time.perf_counter() - started)
+
+    def get_metrics(self) -> dict[str, Any]:
+        return {**asdict(self.metrics), "pending": self._pending, "max_pending": self._max_pending}
+
+
+password_hasher = PasswordHasher(
+    executor_type=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
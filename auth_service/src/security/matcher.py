@@ -0,0 +1,84 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+
+def split_path(path: str) -> list[str]:
+    # INFO "/api/v1/auth/me" и "/api/v1/auth/me/" - один и тот же путь
+    return [segment for segment in path.split('/') if segment]
+
+
+@dataclass
+class _Node:
+    static: dict[str, '_Node'] = field(default_factory=dict)
+    param: '_Node | None' = None
+    # {name:path} - совпадает с остатком пути целиком
+    tail: str | None = None
+    template: str | None = None
+
+
+class PathMatcher:
+    """Префиксное дерево по сегментам шаблонов маршрутов (/api/v1/users/{pk}).
+
+    match() находит шаблон для конкретного пути за O(глубины пути): статический сегмент
+    проверяется раньше параметра, как при маршрутизации в Starlette.
+    """
+
+    def __init__(self, templates: Iterable[str]) -> None:
+        self._root = _Node()
+        for template in templates:
+            self._add(template)
+
+    def _add(self, template: str) -> None:
+        node = self._root
+        for segment in split_path(template):
+            if segment.startswith('{') and segment.endswith('}'):
+                if segment.endswith(':path}'):
+                    node.tail = template
+                    return
+                node.param = node.param or _Node()
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+        node.template = template
+
+    def match(self, path: str) -> str | None:
+        return self._match(self._root, split_path(path), 0)
+
+    def _match(self, node: _Node, segments: list[str], position: int) -> str | None:
+        if position == len(segments):
+            return node.template
+
+        child = node.static.get(segments[position])
+        if child and (template := self._match(child, segments, position + 1)):
+            return template
+        if node.param and (template := self._match(node.param, segments, position + 1)):
+            return template
+        return node.tail
+
+    def __contains__(self, path: str) -> bool:
+        return self.match(path) is not None
+
+
+class RouteResolver:
+    """Шаблон маршрута сервиса для конкретного пути.
+
+    Дерево строится один раз при старте из всех маршрутов приложения, а не из прав токена: иначе путь
+    статического маршрута (/roles/set_role) совпал бы с выданным шаблоном-соседом (/roles/{pk}).
+    Право проверяется уже для найденного шаблона - поиском в множестве прав.
+    """
+
+    def __init__(self) -> None:
+        self._matcher = PathMatcher([])
+
+    def load(self, templates: Iterable[str]) -> None:
+        self._matcher = PathMatcher(templates)
+
+    def resolve(self, path: str) -> str | None:
+        return self._matcher.match(path)
+
+    def is_granted(self, path: str, granted: frozenset[str]) -> bool:
+        template = self.resolve(path)
+        return template is not None and template in granted
+
+
+route_resolver = RouteResolver()
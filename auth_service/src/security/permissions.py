@@ -0,0 +1,84 @@
+import base64
+from functools import lru_cache
+from typing import Any, Iterable
+
+from auth_service.src.database.models.role import Permission, Role
+from auth_service.src.database.repository.role import RoleRepository
+from auth_service.src.database.session import get_db_session_for_main
+
+
+def encode_bitset(indexes: Iterable[int]) -> str:
+    mask = 0
+    for index in indexes:
+        mask |= 1 << index
+    raw = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_bitset(bitset: str) -> int:
+    raw = base64.urlsafe_b64decode(bitset + '=' * (-len(bitset) % 4))
+    return int.from_bytes(raw, 'little')
+
+
+def permission_claims(role: Role | None) -> dict[str, Any]:
+    """Права роли для payload токена: bitset по Permission.index вместо списка URL."""
+    if role is None:
+        return {"perms": ""}
+    return {
+        "role": str(role.pk),
+        "rv": role.version,
+        "perms": encode_bitset(permission.index for permission in role.permissions),
+    }
+
+
+class PermissionRegistry:
+    """Соответствие Permission.index -> Permission.allowed в памяти воркера.
+
+    Bitset из токена раскладывается в frozenset путей один раз для каждой (роль, версия роли, bitset),
+    дальше проверка права - поиск в множестве.
+    """
+
+    def __init__(self, cache_size: int = 1024) -> None:
+        self._allowed: dict[int, str] = {}
+        self._decode = lru_cache(maxsize=cache_size)(self._decode_uncached)
+
+    def load(self, permissions: list[Permission]) -> None:
+        self._allowed = {permission.index: permission.allowed for permission in permissions}
+        self._decode.cache_clear()
+
+    async def refresh(self) -> None:
+        async with get_db_session_for_main() as session:
+            self.load(await RoleRepository(Role, session).get_permissions())
+
+    async def granted(self, payload: dict[str, Any]) -> frozenset[str]:
+        # INFO токены, выпущенные до перехода на bitset, содержат список путей
+        if "permissions" in payload:
+            return frozenset(payload["permissions"])
+        if not payload.get("perms"):
+            return frozenset()
+
+        key = (payload.get("role"), payload.get("rv"), payload["perms"])
+        granted, complete = self._decode(*key)
+        if not complete:
+            # в токене есть право, добавленное после загрузки реестра (например, другим воркером)
+            await self.refresh()
+            granted, _ = self._decode(*key)
+        return granted
+
+    def _decode_uncached(self, role: str | None, version: int | None, bitset: str) -> tuple[frozenset[str], bool]:
+        mask = decode_bitset(bitset)
+        granted = set()
+        complete = True
+        index = 0
+        while mask:
+            if mask & 1:
+                if index in self._allowed:
+                    granted.add(self._allowed[index])
+                else:
+                    complete = False
+            mask >>= 1
+            index += 1
+        return frozenset(granted), complete
+
+
+permission_registry = PermissionRegistry()
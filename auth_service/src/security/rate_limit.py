@@ -0,0 +1,121 @@
+import ipaddress
+import math
+from dataclasses import asdict, dataclass
+from typing import Annotated, Any
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+
+from auth_service.src.cache.cache import Cache, get_cache_storage
+from auth_service.src.core.config import settings
+from auth_service.src.core.metrics import RATE_LIMITED
+
+RATE_LIMIT_KEY = "auth:rate:{route}:{scope}:{value}"
+# login - по логину из формы входа, ip - по адресу клиента (X-Real-IP от nginx), global - на маршрут целиком
+RATE_LIMIT_SCOPES = ("login", "ip", "global")
+
+
+@dataclass(frozen=True)
+class Limit:
+    """count запросов за period секунд; пачка до count запросов подряд, дальше - равномерно."""
+
+    count: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        # "10/60" - 10 запросов за 60 секунд
+        count, _, period = value.partition("/")
+        limit = cls(count=int(count), period=float(period or 1))
+        if limit.count <= 0 or limit.period <= 0:
+            raise ValueError(f"Некорректный лимит {value!r}")
+        return limit
+
+    @property
+    def interval_ms(self) -> float:
+        return self.period * 1000 / self.count
+
+
+@dataclass
+class RateLimitMetrics:
+    checks: int = 0
+    limited: int = 0
+
+
+class RateLimiter:
+    """Лимиты запросов по маршрутам (GCRA в Redis): все лимиты маршрута - один вызов Lua-скрипта.
+
+    Проверка выполняется зависимостью маршрута до вызова сервиса, то есть до хеширования пароля:
+    отклоненный запрос стоит одной команды Redis, а не pbkdf2.
+    """
+
+    def __init__(self, routes: dict[str, dict[str, str]]) -> None:
+        self._routes: dict[str, dict[str, Limit]] = {}
+        for route, limits in routes.items():
+            unknown = set(limits) - set(RATE_LIMIT_SCOPES)
+            if unknown:
+                raise ValueError(f"Неизвестные области лимита {sorted(unknown)} для {route}")
+            self._routes[route] = {scope: Limit.parse(value) for scope, value in limits.items()}
+        self.metrics = RateLimitMetrics()
+
+    async def check(self, cache: Cache, route: str, ip: str, login: str | None = None) -> None:
+        limits = self._routes.get(route)
+        if not limits:
+            return
+        values = {"login": login, "ip": ip, "global": "*"}
+        scopes = [scope for scope in limits if values[scope] is not None]
+        if not scopes:
+            return
+        self.metrics.checks += 1
+        retry_ms, limited = await cache.gcra(
+            [RATE_LIMIT_KEY.format(route=route, scope=scope, value=values[scope]) for scope in scopes],
+            [(limits[scope].interval_ms, limits[scope].count) for scope in scopes],
+        )
+        if limited < 0:
+            return
+        self.metrics.limited += 1
+        RATE_LIMITED.labels(route, scopes[limited]).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Слишком много запросов, повторите позже',
+            headers={"Retry-After": str(max(1, math.ceil(retry_ms / 1000)))},
+        )
+
+    def get_metrics(self) -> dict[str, Any]:
+        return asdict(self.metrics)
+
+
+rate_limiter = RateLimiter(routes=settings.RATE_LIMITS)
+trusted_proxies = [ipaddress.ip_network(network, strict=False) for network in settings.TRUSTED_PROXIES]
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    # INFO X-Real-IP выставляет nginx (configs/auth-service.conf). От остальных адресов заголовок не принимается:
+    # иначе клиент, обратившийся к сервису в обход nginx, получал бы новый лимит "ip" на каждый запрос
+    peer = request.client.host if request.client else None
+    ip = request.headers.get("x-real-ip")
+    if ip and peer and is_trusted_proxy(peer):
+        return ip
+    return peer or "unknown"
+
+
+async def rate_limit(request: Request, cache: Cache = Depends(get_cache_storage)) -> None:
+    """Зависимость маршрута: лимиты по IP и общий из RATE_LIMITS."""
+    await rate_limiter.check(cache, request.scope["route"].path, client_ip(request))
+
+
+async def rate_limit_login(
+    request: Request,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    cache: Cache = Depends(get_cache_storage),
+) -> None:
+    """Зависимость входа: еще и лимит по логину. Форма разбирается один раз - FastAPI кэширует зависимость."""
+    await rate_limiter.check(cache, request.scope["route"].path, client_ip(request), login=form_data.username)
@@ -0,0 +1,83 @@
+import hashlib
+import time
+from typing import Any
+
+from auth_service.src.cache.cache import Cache
+from auth_service.src.core.config import settings
+
+REVOKED_JTI_KEY = "auth:revoked:{jti}"
+TOKEN_EPOCH_KEY = "auth:token_epoch:{login}"
+REVOKED_DEVICE_KEY = "auth:revoked_device:{login}:{device_id}"
+# время (сек) изменения пользователя: токены, выпущенные раньше, должны быть перевыпущены
+REISSUE_KEY = "auth:reissue:{login}"
+
+
+def hash_refresh_token(token: str) -> str:
+    # INFO в БД хранится только хеш: утечка таблицы tokens не дает действующих refresh token
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenRevocation:
+    """Отзыв токенов без хранения самих токенов.
+
+    - отзыв одного токена: ключ по jti с TTL, равным оставшемуся времени жизни токена;
+    - отзыв всех токенов пользователя: счетчик-эпоха в Redis. Токен хранит эпоху на момент выпуска
+      (claim epoch) и считается отозванным, если эпоха пользователя с тех пор выросла;
+    - отзыв всех токенов устройства (повторное использование refresh token): ключ по (login, device_id)
+      с TTL, равным времени жизни refresh token.
+
+    Все проверки - это ключи, которые читаются одним MGET (см. keys() и is_revoked()).
+    """
+
+    def __init__(self, cache: Cache) -> None:
+        self.cache = cache
+
+    @staticmethod
+    def keys(payload: dict[str, Any]) -> list[str]:
+        return [
+            REVOKED_JTI_KEY.format(jti=payload['jti']),
+            TOKEN_EPOCH_KEY.format(login=payload['sub']),
+            REVOKED_DEVICE_KEY.format(login=payload['sub'], device_id=payload.get('device_id')),
+        ]
+
+    @staticmethod
+    def is_revoked(payload: dict[str, Any], values: list[Any]) -> bool:
+        revoked, epoch, device_revoked = values
+        return bool(revoked) or bool(device_revoked) or payload.get('epoch', 0) < int(epoch or 0)
+
+    async def check(self, payload: dict[str, Any]) -> bool:
+        return self.is_revoked(payload, await self.cache.get_many(self.keys(payload)))
+
+    async def revoke(self, payload: dict[str, Any]) -> None:
+        ttl = int(payload['exp'] - time.time())
+        if ttl > 0:
+            await self.cache.set_cache(key=REVOKED_JTI_KEY.format(jti=payload['jti']), value=1, expire=ttl)
+
+    async def revoke_device(self, payload: dict[str, Any]) -> None:
+        """Отозвать все токены устройства, включая еще не истекшие access token."""
+        key = REVOKED_DEVICE_KEY.format(login=payload['sub'], device_id=payload['device_id'])
+        await self.cache.set_cache(
+            key=key, value=1, expire=int(settings.REFRESH_TOKEN_EXPIRE_MINUTES.total_seconds())
+        )
+
+    async def require_reissue(self, login: str) -> None:
+        """Пометить токены пользователя, выпущенные до этого момента, как устаревшие (смена роли, логина, пароля).
+
+        Нужно проверкам без Postgres (/verify): полная проверка узнает об изменении из users.invalid_token.
+        """
+        await self.cache.set_cache(
+            key=REISSUE_KEY.format(login=login),
+            value=int(time.time()),
+            expire=int(settings.ACCESS_TOKEN_EXPIRE_MINUTES.total_seconds()),
+        )
+
+    @staticmethod
+    def is_outdated(payload: dict[str, Any], reissue_after: Any) -> bool:
+        return reissue_after is not None and payload.get('iat', 0) < int(reissue_after)
+
+    async def get_epoch(self, login: str) -> int:
+        return int(await self.cache.get_cache(TOKEN_EPOCH_KEY.format(login=login)) or 0)
+
+    async def bump_epoch(self, login: str) -> int:
+        """Отозвать все ранее выпущенные токены пользователя. Возвращает новую эпоху."""
+        return await self.cache.increment(TOKEN_EPOCH_KEY.format(login=login))
@@ -0,0 +1,47 @@
+"""Проверка access_token в других сервисах без обращения к auth_service.
+
+Публичные ключи берутся с /.well-known/jwks.json и кэшируются в памяти процесса.
+JWKS запрашивается заново, только когда кэш устарел или в токене встретился новый kid (ротация ключей).
+
+Модуль не зависит от остального auth_service (настроек, базы): его можно скопировать или импортировать
+в сервис-потребитель.
+
+Пример:
+    verifier = TokenVerifier("http://auth-service:8080/.well-known/jwks.json")
+    payload = verifier.verify(token)
+"""
+import asyncio
+from typing import Any, Sequence
+
+import jwt
+
+# INFO совпадают с JWTAuth.ISSUER и TokenType.ACCESS; импорт JWTAuth потянул бы настройки auth_service
+ISSUER = 'befunny@auth_service'
+ACCESS_TOKEN_TYPE = 'ACCESS'
+
+
+class TokenVerifier:
+
+    def __init__(
+        self,
+        jwks_url: str,
+        algorithms: Sequence[str] = ("RS256", "EdDSA"),
+        issuer: str = ISSUER,
+        cache_ttl: int = 300,
+    ) -> None:
+        self._algorithms = list(algorithms)
+        self._issuer = issuer
+        self._jwks_client = jwt.PyJWKClient(jwks_url, cache_keys=True, lifespan=cache_ttl)
+
+    def verify(self, token: str) -> dict[str, Any]:
+        """Проверить подпись, срок действия, издателя и тип токена. Бросает jwt.PyJWTError, если токен невалиден."""
+        signing_key = self._jwks_client.get_signing_key_from_jwt(token)
+        payload = jwt.decode(token, signing_key.key, algorithms=self._algorithms, issuer=self._issuer)
+        # refresh token несет те же права и живет дольше - для доступа к ресурсам он не годится
+        if payload.get('type') != ACCESS_TOKEN_TYPE:
+            raise jwt.InvalidTokenError('Нужен access token')
+        return payload
+
+    async def verify_async(self, token: str) -> dict[str, Any]:
+        # INFO PyJWKClient ходит за JWKS синхронно, поэтому в async-сервисах проверка идет в потоке
+        return await asyncio.to_thread(self.verify, token)
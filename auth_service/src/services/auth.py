@@ -1,40 +1,60 @@
+import asyncio
+import logging
 import uuid
 from datetime import datetime, timezone
 from functools import lru_cache
-from typing import Annotated, List
+from typing import Annotated
 
 import jwt
 from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 
 from auth_service.src.cache.cache import Cache, get_cache_storage
+from auth_service.src.cache.decision import decision_cache
+from auth_service.src.cache.login_filter import login_filter
+from auth_service.src.cache.role_versions import role_versions
+from auth_service.src.cache.single_flight import principal_lookups
 from auth_service.src.core.config import settings
+from auth_service.src.database.history_writer import history_writer
 from auth_service.src.database.models.role import Role
 from auth_service.src.database.models.user import User
 from auth_service.src.database.repository.role import RoleRepository
 from auth_service.src.database.repository.user import (
+    WITH_ROLE_PERMISSIONS,
     UserRepository,
     get_user_repository,
 )
+from auth_service.src.database.session import get_db_session_for_main
 from auth_service.src.dto.auth import TokensDTO
 from auth_service.src.dto.user import (
     UserCredentialsDTO,
     UserCredentialsDTO_v2,
+    UserPrincipalDTO,
     UserUpdateDTO,
 )
-from auth_service.src.security.JWTAuth import JWTAuth, JWTError, get_jwt_auth, get_token
+from auth_service.src.security.hashing import password_hasher
+from auth_service.src.security.JWTAuth import JWTAuth, JWTError, TokenType, get_jwt_auth, get_token
+from auth_service.src.security.matcher import route_resolver
+from auth_service.src.security.permissions import permission_claims, permission_registry
+from auth_service.src.security.revocation import TokenRevocation, hash_refresh_token
 from auth_service.src.services.role import RoleService
 
+logger = logging.getLogger(__name__)
+
+# фоновые пересчеты хешей: ссылки держатся до завершения задач
+_rehash_tasks: set[asyncio.Task] = set()
+
+
+async def wait_rehash_tasks() -> None:
+    """Дождаться фоновых пересчетов хешей: при остановке воркера - до закрытия пула хеширования и engine."""
+    if _rehash_tasks:
+        await asyncio.gather(*_rehash_tasks, return_exceptions=True)
+
 # to get a string like this run:
 # openssl rand -hex 32
 
 
 class AuthService:
-    # https://security.stackexchange.com/questions/4781/do-any-security-experts-recommend-bcrypt-for-password-storage/6415#6415
-    # bcrypt vs pdkdf2 == все равно. оба хороши. Цель достигнуть 350мс на хеширование функции подбором раундов.
-    # deprecated='auto' - разрешить только схемы указанные в schemes=[]
-    pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto", pbkdf2_sha256__default_rounds=30000)
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
     def __init__(
@@ -45,36 +65,53 @@ class AuthService:
         self.request = request
         self.response = response
         self.cache = cache
-
+        self.revocation = TokenRevocation(cache)
+        # INFO токен декодируется один раз за запрос: зависимость авторизации и ручка используют один payload
+        self._payloads: dict[str, dict] = {}
+        self._granted: dict[str, frozenset[str]] = {}
+        # payload токена, прошедшего get_current_user_if_has_permissions в этом запросе
+        self.current_payload: dict | None = None
+        # пользователь с ролью из базы, если права в этом токене устарели (invalid_token или новая версия роли)
+        self.reloaded_user: User | None = None
+
+    # INFO хеширование выполняется в пуле процессов (см. security/hashing.py), event loop не блокируется
     @classmethod
-    def verify_password(cls, plain_password, hashed_password):
-        return cls.pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(cls, plain_password, hashed_password):
+        return await password_hasher.verify(plain_password, hashed_password)
 
     @classmethod
-    def get_password_hash(cls, password):
-        return cls.pwd_context.hash(password)
+    async def get_password_hash(cls, password):
+        return await password_hasher.hash(password)
+
+    async def _generate_tokens(self, login: str, device_id: str, permissions: dict) -> tuple[str, str]:
+        # INFO epoch - эпоха токенов пользователя на момент выпуска, см. security/revocation.py
+        epoch = await self.revocation.get_epoch(login)
+        claims = {'device_id': device_id, "epoch": epoch, **permissions}
+        access_token = self._jwt_auth.generate_access_token(subject=str(login), payload=dict(claims))
+        refresh_token = self._jwt_auth.generate_refresh_token(subject=str(login), payload=dict(claims))
+        return access_token, refresh_token
 
     async def _issue_tokens_for_user(
-        self, user: User, device_id: str = str(uuid.uuid4()), permissions: list[str] = []
+        self, user: User | UserPrincipalDTO, device_id: str | None = None, role: Role | None = None
     ) -> tuple[str, str]:
-        access_token = self._jwt_auth.generate_access_token(
-            subject=str(user.login), payload={'device_id': device_id, "permissions": permissions}
-        )
-        refresh_token = self._jwt_auth.generate_refresh_token(
-            subject=str(user.login), payload={'device_id': device_id, "permissions": permissions}
-        )
-        await self.repository.set_or_update_refresh_token(user, refresh_token)
+        # INFO новое устройство получает свой device_id; refresh token хранится по (user_id, device_id)
+        device_id = device_id or str(uuid.uuid4())
+        # INFO права передаются bitset-ом с версией роли, а не списком URL (см. security/permissions.py)
+        access_token, refresh_token = await self._generate_tokens(user.login, device_id, permission_claims(role))
+        await self.repository.store_refresh_token(user.pk, device_id, hash_refresh_token(refresh_token))
 
         return access_token, refresh_token
 
     async def register_admin(self, body: UserCredentialsDTO | UserCredentialsDTO_v2) -> User:
-        if await self.repository.find_by_login(body.login):
+        # INFO "точно нет" по фильтру логинов - SELECT не нужен, уникальность все равно проверит INSERT
+        if await login_filter.may_exist(self.cache, body.login) and await self.repository.find_by_login(body.login):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail='Нельзя создать пользователя с такими параметрами'
             )
 
-        body.password = self.get_password_hash(body.password)
+        body.password = await self.get_password_hash(body.password)
 
+        await login_filter.add(self.cache, body.login)
         user = await self.repository.create(body.model_dump())
         if isinstance(body, UserCredentialsDTO):
             await self.repository.partial_update(pk=user.pk, data={'is_active': True})
@@ -83,13 +120,15 @@ class AuthService:
 
     # INFO ok
     async def register(self, body: UserCredentialsDTO | UserCredentialsDTO_v2) -> User:
-        if await self.repository.find_by_login(body.login):
+        # INFO "точно нет" по фильтру логинов - SELECT не нужен, уникальность все равно проверит INSERT
+        if await login_filter.may_exist(self.cache, body.login) and await self.repository.find_by_login(body.login):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail='Нельзя создать пользователя с такими параметрами'
             )
 
-        body.password = self.get_password_hash(body.password)
+        body.password = await self.get_password_hash(body.password)
 
+        await login_filter.add(self.cache, body.login)
         user = await self.repository.create(body.model_dump())
         if isinstance(body, UserCredentialsDTO):
             await self.repository.partial_update(pk=user.pk, data={'is_active': True})
@@ -105,54 +144,105 @@ class AuthService:
         return user
 
     async def login(self, body: OAuth2PasswordRequestForm) -> tuple[TokensDTO, None] | tuple[None, str]:
-        user = await self.repository.find_by_login(body.username)
-        if not user or not self.verify_password(body.password, user.password):
+        user = None
+        if await login_filter.may_exist(self.cache, body.username):
+            user = await self.repository.find_by_login(body.username, WITH_ROLE_PERMISSIONS)
+        if not user:
+            await password_hasher.verify_dummy(body.password)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Incorrect login or password')
+        if not await self.verify_password(body.password, user.password):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Incorrect login or password')
         if not user.is_active:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='User blocked')
-        if user.role:
-            permissions: List[str] = [permission.allowed for permission in user.role.permissions]
-            # INFO add refresh_token in postgres  +
-            access_token, refresh_token = await self._issue_tokens_for_user(user=user, permissions=permissions)
-        else:
-            access_token, refresh_token = await self._issue_tokens_for_user(user=user, permissions=[])
+        if password_hasher.needs_update(user.password):
+            self._rehash_later(user, body.password)
+        # INFO токены входа выпускаются с текущей ролью: перевыпуск по invalid_token (после назначения роли) не нужен
+        if user.invalid_token:
+            await self.repository.partial_update(pk=user.pk, data={'invalid_token': False})
+        # INFO add refresh_token in postgres  +
+        access_token, refresh_token = await self._issue_tokens_for_user(user=user, role=user.role)
 
         self.response.set_cookie(key="user_access_token", value=access_token, httponly=True)
         self.response.set_cookie(key="user_refresh_token", value=refresh_token, httponly=True)
-        await self.repository.add_to_history(user, self.request.headers['user-agent'])
+        # INFO история входов пишется пачками в фоне, ответ на логин ее не ждет (см. database/history_writer.py)
+        await history_writer.add(user.pk, self.request.headers['user-agent'])
 
         return TokensDTO(access_token=access_token, refresh_token=refresh_token, token_type='bearer'), None
 
+    @staticmethod
+    def _rehash_later(user: User, password: str) -> None:
+        # INFO хеш по старым схеме или раундам пересчитывается после ответа: вход не ждет второго хеширования
+        task = asyncio.create_task(AuthService._rehash(user.pk, user.password, password))
+        _rehash_tasks.add(task)
+        task.add_done_callback(_rehash_tasks.discard)
+
+    @staticmethod
+    async def _rehash(user_id: uuid.UUID, old_hash: str, password: str) -> None:
+        try:
+            new_hash = await password_hasher.hash(password)
+        except HTTPException:
+            # пул хеширования перегружен - пересчитаем при следующем входе
+            return
+        async with get_db_session_for_main() as session:
+            if await UserRepository(User, session).replace_password_hash(user_id, old_hash, new_hash):
+                password_hasher.metrics.rehashed += 1
+                logger.info("password hash of %s updated to current parameters", user_id)
+
     async def logout(self):
-        # TODO remove refresh_token to postgres ??
         self.response.delete_cookie(key="user_access_token", httponly=True)
         self.response.delete_cookie(key="user_refresh_token", httponly=True)
-        await self.cache.set_cache(
-            key=self.request.cookies['user_access_token'],
-            value=self.request.cookies['user_access_token'],
-            expire=settings.ACCESS_TOKEN_EXPIRE_MINUTES.seconds,
-        )
+        # INFO в черный список попадает только jti с TTL до истечения токена, а не сам токен
+        for key in ("user_access_token", "user_refresh_token"):
+            try:
+                payload = self._jwt_auth.verify_token(self.request.cookies[key])
+            except (KeyError, jwt.PyJWTError):
+                continue
+            await self.revocation.revoke(payload)
+            await decision_cache.forget_token(self.cache, payload['jti'])
+            if payload['type'] == TokenType.REFRESH.value:
+                await self.repository.delete_refresh_tokens(payload['sub'], device_id=payload['device_id'])
 
         return {'message': 'Пользователь успешно вышел из системы'}
 
-    async def _update_tokens_after_change_role_or_permission(self, user: User):
+    async def logout_other_devices(self, user: UserPrincipalDTO, token: str):
+        """Отозвать все токены пользователя (O(1), через эпоху) и перевыпустить пару для текущего устройства."""
+        payload = await self.decode_token(token)
+        await self.revocation.bump_epoch(user.login)
+        await decision_cache.invalidate_user(self.cache, user.login)
+        await self.repository.delete_refresh_tokens(user.login, keep_device_id=payload['device_id'])
+
+        user_db = await self.repository.find_by_login(user.login, WITH_ROLE_PERMISSIONS)
+        access_token, refresh_token = await self._issue_tokens_for_user(
+            user=user_db, device_id=payload['device_id'], role=user_db.role
+        )
+        self.response.set_cookie(key="user_access_token", value=access_token, httponly=True)
+        self.response.set_cookie(key="user_refresh_token", value=refresh_token, httponly=True)
+
+        return {'message': 'Выполнен выход на всех остальных устройствах'}
+
+    async def _update_tokens_after_change_role_or_permission(self, user: User, device_id: str):
         """Автоматический проброс permissions в access_token, refresh_token
         пользователя после обновления его прав без необходимости re-login пользователя
 
         invalid_token устанавливается в true после обновления роли или permission.
         """
-        perms_allowed = [permission.allowed for permission in user.role.permissions]
-        access_token, refresh_token = await self._issue_tokens_for_user(user=user, permissions=perms_allowed)
+        access_token, refresh_token = await self._issue_tokens_for_user(
+            user=user, device_id=device_id, role=user.role
+        )
         self.response.set_cookie(key="user_access_token", value=access_token, httponly=True)
         self.response.set_cookie(key="user_refresh_token", value=refresh_token, httponly=True)
         await self.repository.partial_update(pk=user.pk, data={"invalid_token": False})
-        self.actual_refresh_token = refresh_token
+
+    def _current_device_id(self) -> str | None:
+        return self.current_payload['device_id'] if self.current_payload else None
 
     # FIXME rename здесь не только декодирование токена, но и проверка на наличие необходимых атрибутов.
     async def decode_token(self, token: str):
+        if token in self._payloads:
+            return self._payloads[token]
         try:
-            payload = jwt.decode(token, self._jwt_auth._config.secret, algorithms=[self._jwt_auth._config.algorithm])
-        except (JWTError, jwt.ExpiredSignatureError):
+            payload = self._jwt_auth.verify_token(token)
+        except (JWTError, jwt.PyJWTError):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Токен не валидный!')
 
         expire = payload.get('exp')
@@ -163,82 +253,143 @@ class AuthService:
         login = payload.get('sub')
         if not login:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Токен не содержит логин пользователя')
+        self._payloads[token] = payload
         return payload
 
+    async def get_granted_permissions(self, payload: dict) -> frozenset[str]:
+        """Шаблоны маршрутов, разрешенные токеном. Путь сверяется с ними через route_resolver."""
+        granted = self._granted.get(payload['jti'])
+        if granted is None:
+            granted = await permission_registry.granted(payload)
+            self._granted[payload['jti']] = granted
+        return granted
+
     async def get_endpoint_access(self, request_endpoint: str, token: str):
         # in DB
         # permissions: List[str] = [permission.allowed for permission in user.role.permissions]
         # in CPU
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        if request_endpoint in payload["permissions"]:
-            return True
+        payload = await self.decode_token(token)
+        return route_resolver.is_granted(request_endpoint, await self.get_granted_permissions(payload))
 
-        return False
+    async def get_endpoints_access(self, request_endpoints: list[str], token: str) -> dict[str, bool]:
+        payload = await self.decode_token(token)
+        granted = await self.get_granted_permissions(payload)
+        return {endpoint: route_resolver.is_granted(endpoint, granted) for endpoint in request_endpoints}
 
-    async def update_tokens_pair(self, user: User):
-        # check refresh_token in db
-        actual_refresh_token = self.actual_refresh_token
-        msg = 'Refresh token отсутствует'
-        if not actual_refresh_token:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=msg)
-        has_refresh_token = await self.repository.find_refresh_token(user)
-        if not has_refresh_token:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=msg)
+    async def update_tokens_pair(self, user: UserPrincipalDTO, token: str):
+        """Ротация refresh token: старый токен заменяется новым одним UPDATE ... WHERE token_hash = :old.
 
-        if not has_refresh_token.refresh_token == actual_refresh_token:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ за")
+        Если UPDATE ничего не изменил, а запись устройства есть - предъявлен уже использованный токен
+        (украден или переигран): отзываются все токены устройства.
+        """
+        payload = await self.decode_token(token)
+        if payload['type'] != TokenType.REFRESH.value:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Refresh token отсутствует')
 
         # генерируем новый refresh_token для повышения безопасности (это называется "refresh token rotation").
-        access_token, refresh_token = await self._issue_tokens_for_user(user=user, permissions=[])
+        # права переносятся из предъявленного токена, а если они устарели - берутся из роли в базе.
+        # INFO перевыпуск идет только через ротацию: отдельная запись хеша сломала бы compare-and-swap ниже
+        if self.reloaded_user is not None:
+            permissions = permission_claims(self.reloaded_user.role)
+        else:
+            permissions = {key: payload[key] for key in ('role', 'rv', 'perms', 'permissions') if key in payload}
+        access_token, refresh_token = await self._generate_tokens(user.login, payload['device_id'], permissions)
+        rotated = await self.repository.rotate_refresh_token(
+            user.pk, payload['device_id'], hash_refresh_token(token), hash_refresh_token(refresh_token)
+        )
+        if not rotated:
+            if await self.repository.delete_refresh_tokens(user.login, device_id=payload['device_id']):
+                await self.revocation.revoke_device(payload)
+                await decision_cache.invalidate_user(self.cache, payload['sub'])
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Refresh token уже использован')
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Refresh token отозван')
+        if self.reloaded_user is not None and self.reloaded_user.invalid_token:
+            await self.repository.partial_update(pk=user.pk, data={"invalid_token": False})
+
         self.response.set_cookie(key="user_access_token", value=access_token, httponly=True)
         self.response.set_cookie(key="user_refresh_token", value=refresh_token, httponly=True)
-        # await self.repository.add_to_history(user, self.request.headers['user-agent'])
 
         return TokensDTO(access_token=access_token, refresh_token=refresh_token, token_type='bearer')
 
     async def get_current_user_if_has_permissions(self, token: Annotated[str, Depends(get_token)]):
-        has_token = await self.cache.get_cache(key=token)
-        if has_token:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Токен в черном списке')
-        # TODO add decode result in Redis??
         payload = await self.decode_token(token)
-
+        self.current_payload = payload
         # запрошенный эндпоинт разрешен для использования владельцем токена.
-        if not self.request.url.path in payload["permissions"]:
+        # INFO дальше используется шаблон маршрута: решения для /users/1 и /users/2 кэшируются одной записью
+        path = route_resolver.resolve(self.request.url.path)
+        if path is None or path not in await self.get_granted_permissions(payload):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Недостаточно прав')
 
-        user = await self.repository.find_by_login(payload['sub'])
-        if not user:
+        # INFO повторный запрос с тем же токеном отвечается из кэша решений без Postgres (см. cache/decision.py)
+        # проверки отзыва токена (jti и эпоха пользователя) и версии роли читаются тем же MGET
+        revocation_keys = self.revocation.keys(payload)
+        decision = await decision_cache.get(
+            self.cache, payload, path, revocation_keys + role_versions.keys(payload)
+        )
+        checks = decision.checks
+        if checks and self.revocation.is_revoked(payload, checks[:len(revocation_keys)]):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Токен в черном списке')
+        # права роли изменились после выпуска токена (см. cache/role_versions.py)
+        role_changed = role_versions.is_stale(payload, checks[len(revocation_keys):])
+        if decision.principal and not role_changed:
+            if decision.checks:
+                decision_cache.remember(payload, path, decision.principal)
+            return decision.principal
+
+        # INFO для авторизации достаточно principal (1 SELECT), роль с правами грузится только при смене прав.
+        # Параллельные запросы одного пользователя (страница фронтенда) делят один SELECT
+        principal = await principal_lookups.do(payload['sub'], lambda: self._find_principal(payload['sub']))
+        if not principal:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not found')
 
-        if user.invalid_token:  # type: ignore
-            await self._update_tokens_after_change_role_or_permission(user)
+        if principal.invalid_token or role_changed:
+            user = await self.repository.find_by_login(principal.login, WITH_ROLE_PERMISSIONS)
+            # INFO права в токене устарели: путь проверяется по текущим правам роли, а не по токену
+            if path not in await permission_registry.granted(permission_claims(user.role)):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Недостаточно прав')
+            self.reloaded_user = user
+            # refresh token не перевыпускается здесь: его ротирует update_tokens_pair уже с правами из базы
+            if payload['type'] != TokenType.REFRESH.value:
+                await self._update_tokens_after_change_role_or_permission(user, payload['device_id'])
+        else:
+            await decision_cache.set(self.cache, payload, path, principal, decision.epochs)
 
-        return user
+        return principal
+
+    @staticmethod
+    async def _find_principal(login: str) -> UserPrincipalDTO | None:
+        # INFO своя сессия: общий SELECT не должен зависеть от сессии запроса, который его начал
+        async with get_db_session_for_main() as session:
+            return await UserRepository(User, session).find_principal(login)
 
     # INFO dry
     async def change_login(
         self,
-        user: User,
+        user: UserPrincipalDTO,
         data: UserUpdateDTO,
     ):
+        if data.login:
+            await login_filter.add(self.cache, data.login)
         updated_model = await self.repository.partial_update(user.pk, data.model_dump())
-        access_token, refresh_token = await self._issue_tokens_for_user(updated_model)
+        await decision_cache.invalidate_user(self.cache, user.login)
+        access_token, refresh_token = await self._issue_tokens_for_user(updated_model, self._current_device_id())
         self.response.set_cookie(key="user_access_token", value=access_token, httponly=True)
         self.response.set_cookie(key="user_refresh_token", value=refresh_token, httponly=True)
         return updated_model
 
     # INFO dry
-    async def change_password(self, user: User, data: UserUpdateDTO):
-        data.password = self.get_password_hash(data.password)
+    async def change_password(self, user: UserPrincipalDTO, data: UserUpdateDTO):
+        data.password = await self.get_password_hash(data.password)
         updated_model = await self.repository.partial_update(user.pk, data.model_dump())
-        access_token, refresh_token = await self._issue_tokens_for_user(updated_model)
+        await decision_cache.invalidate_user(self.cache, user.login)
+        access_token, refresh_token = await self._issue_tokens_for_user(updated_model, self._current_device_id())
         self.response.set_cookie(key="user_access_token", value=access_token, httponly=True)
         self.response.set_cookie(key="user_refresh_token", value=refresh_token, httponly=True)
         return updated_model
 
     async def invalidate_tokens(self, role: Role):
-        await self.repository.invalidate_tokens(role)
+        """Перевыпустить токены всех пользователей роли при следующем запросе: одна запись версии роли в Redis."""
+        await role_versions.bump(self.cache, role)
 
 
 @lru_cache()
@@ -6,6 +6,8 @@ import jwt
 from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.routing import APIRoute
 
+from auth_service.src.cache.cache import get_cache_storage
+from auth_service.src.cache.decision import decision_cache
 from auth_service.src.core.config import settings
 from auth_service.src.database.models.role import Permission, Role
 from auth_service.src.database.models.user import User
@@ -13,7 +15,7 @@ from auth_service.src.database.repository.role import (
     RoleRepository,
     get_role_repository,
 )
-from auth_service.src.dto.role import RoleCreateDTO, RoleUpdateDTO
+from auth_service.src.dto.role import RoleCreateDTO, RolePermissionsChangeDTO, RoleUpdateDTO
 
 
 class RoleService:
@@ -43,6 +45,8 @@ class RoleService:
 
     async def delete(self, pk: uuid.UUID):
         status = await self.repository.delete(pk)
+        # INFO вместе с ролью удаляются ее пользователи (cascade)
+        await decision_cache.invalidate_all(await get_cache_storage())
 
         return status
 
@@ -54,6 +58,7 @@ class RoleService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Incorrect user login')
 
         role = await self.repository.set_role_for_user(pk, user=user_db)
+        await decision_cache.invalidate_user(await get_cache_storage(), login)
 
         return role
 
@@ -68,12 +73,34 @@ class RoleService:
         await self.repository.add_permissions(endpoints=api_url_list)
 
     async def set_permissions_to_role(self, role_pk: uuid.UUID, permissions: List[str]) -> Role:
+        role_db = await self._get_role(role_pk)
+        await self.repository.set_permission_to_role(role_db, permissions)
+
+        return role_db
+
+    async def revoke_permissions_from_role(self, role_pk: uuid.UUID, permissions: List[str]) -> Role:
+        role_db = await self._get_role(role_pk)
+        await self.repository.change_role_permissions(role_db, revoke=permissions)
+
+        return role_db
+
+    async def replace_permissions(
+        self, role_pk: uuid.UUID, permissions: List[str]
+    ) -> tuple[Role, RolePermissionsChangeDTO]:
+        """Привести права роли к переданному набору: выдаются и отзываются только отличающиеся права."""
+        role_db = await self._get_role(role_pk)
+        current = await self.repository.get_role_permissions(role_pk)
+        target = set(permissions)
+        added, removed = await self.repository.change_role_permissions(
+            role_db, grant=list(target - current), revoke=list(current - target)
+        )
+
+        return role_db, RolePermissionsChangeDTO(added=added, removed=removed)
+
+    async def _get_role(self, role_pk: uuid.UUID) -> Role:
         role_db = await self.repository.get(role_pk)
         if not role_db:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Role is not exists')
-
-        await self.repository.set_permission_to_role(role_db, permissions)
-
         return role_db
 
 
@@ -1,14 +1,40 @@
+import base64
+import binascii
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
 from functools import lru_cache
 from typing import Annotated
+from uuid import UUID
 
-from fastapi import Depends
+from fastapi import Depends, HTTPException, status
 
-from auth_service.src.database.models.user import User
+from auth_service.src.core.config import settings
+from auth_service.src.database.models.user import User, UserSessionLog
 from auth_service.src.database.repository.user import (
     UserRepository,
     get_user_repository,
 )
-from auth_service.src.dto.user import UserUpdateDTO
+from auth_service.src.database.session import get_db_session_for_main
+from auth_service.src.dto.user import (
+    UserHistoryPageDTO,
+    UserPrincipalDTO,
+    UserSessionLogDTO,
+    UserUpdateDTO,
+)
+
+
+def encode_history_cursor(connection: UserSessionLog) -> str:
+    raw = json.dumps([connection.created_at.isoformat(), str(connection.pk)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), UUID(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Некорректный cursor')
 
 
 class UserService:
@@ -26,6 +52,42 @@ class UserService:
         updated_model = await self.repository.partial_update(user.pk, data.model_dump())
         return updated_model
 
+    async def get_history_page(self, user: UserPrincipalDTO, limit: int, cursor: str | None) -> UserHistoryPageDTO:
+        after = decode_history_cursor(cursor) if cursor else None
+        # INFO берем на 1 запись больше, чтобы понять, есть ли следующая страница
+        connections = await self.repository.get_history_page(user.pk, limit + 1, after)
+        next_cursor = encode_history_cursor(connections[limit - 1]) if len(connections) > limit else None
+
+        return UserHistoryPageDTO(
+            items=[UserSessionLogDTO.model_validate(connection) for connection in connections[:limit]],
+            next_cursor=next_cursor,
+        )
+
+    async def find_by_login(self, login: str) -> UserPrincipalDTO:
+        user = await self.repository.find_principal(login)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Incorrect user login')
+        return user
+
+    @staticmethod
+    async def export_history(user_id: UUID) -> AsyncIterator[bytes]:
+        """Вся история входов в NDJSON, пачками по keyset-курсору.
+
+        Ответ стримится уже после выхода из зависимостей запроса, поэтому используется своя сессия.
+        """
+        async with get_db_session_for_main() as session:
+            repository = UserRepository(User, session)
+            after = None
+            while True:
+                connections = await repository.get_history_page(user_id, settings.HISTORY_EXPORT_BATCH_SIZE, after)
+                if not connections:
+                    break
+                yield b"".join(
+                    UserSessionLogDTO.model_validate(connection).model_dump_json().encode() + b"\n"
+                    for connection in connections
+                )
+                after = connections[-1].created_at, connections[-1].pk
+
 
 @lru_cache()
 def get_user_service(
@@ -0,0 +1,71 @@
+import time
+from functools import lru_cache
+from typing import Annotated, Any
+
+import jwt
+from fastapi import Depends, HTTPException, status
+
+from auth_service.src.cache.cache import Cache, get_cache_storage
+from auth_service.src.cache.role_versions import role_versions
+from auth_service.src.core.config import settings
+from auth_service.src.security.JWTAuth import JWTAuth, JWTError, TokenType, get_jwt_auth
+from auth_service.src.security.matcher import route_resolver
+from auth_service.src.security.permissions import permission_registry
+from auth_service.src.security.revocation import REISSUE_KEY, TokenRevocation
+
+# INFO отказ не кэшируется: после refresh клиент должен сразу получить 200
+NO_STORE = {"Cache-Control": "no-store"}
+
+
+class AccessVerifier:
+    """Проверка access token для nginx auth_request без Postgres и ORM.
+
+    Подпись и срок - в CPU, отзыв токена, версия роли и отметка изменения пользователя - один MGET,
+    право на исходный URI - по правам из токена (bitset) и реестру прав в памяти воркера.
+    """
+
+    def __init__(self, jwt_auth: JWTAuth, cache: Cache) -> None:
+        self.jwt_auth = jwt_auth
+        self.cache = cache
+        self.revocation = TokenRevocation(cache)
+
+    async def verify(self, token: str, uri: str | None) -> tuple[dict[str, Any], int]:
+        """payload токена и сколько секунд можно кэшировать положительный ответ."""
+        try:
+            payload = self.jwt_auth.verify_token(token)
+        except (JWTError, jwt.PyJWTError):
+            # истекший токен тоже попадает сюда (ExpiredSignatureError)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Токен не валидный!', headers=NO_STORE)
+        if payload.get('type') != TokenType.ACCESS.value or not payload.get('sub'):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Нужен access token', headers=NO_STORE)
+
+        revocation_keys = self.revocation.keys(payload)
+        role_keys = role_versions.keys(payload)
+        values = await self.cache.get_many(
+            [*revocation_keys, *role_keys, REISSUE_KEY.format(login=payload['sub'])]
+        )
+        if self.revocation.is_revoked(payload, values[:len(revocation_keys)]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail='Токен в черном списке', headers=NO_STORE
+            )
+        if role_versions.is_stale(payload, values[len(revocation_keys):-1]) or self.revocation.is_outdated(
+            payload, values[-1]
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail='Токен устарел, обновите его', headers=NO_STORE
+            )
+
+        if uri is not None:
+            path = uri.split('?', 1)[0]
+            if not route_resolver.is_granted(path, await permission_registry.granted(payload)):
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Недостаточно прав', headers=NO_STORE)
+
+        return payload, max(0, min(settings.VERIFY_CACHE_MAX_AGE, int(payload['exp'] - time.time())))
+
+
+@lru_cache()
+def get_access_verifier(
+    jwt_auth: Annotated[JWTAuth, Depends(get_jwt_auth)],
+    cache: Cache = Depends(get_cache_storage),
+) -> AccessVerifier:
+    return AccessVerifier(jwt_auth=jwt_auth, cache=cache)
@@ -0,0 +1,290 @@
+"""Нагрузочный прогон эндпоинтов auth: register, login, /me/, refresh, logout, check-user-permissions.
+
+Для каждого сценария печатает p50/p95/p99 латентности, пропускную способность и среднее число
+SQL-запросов и команд Redis на один запрос.
+
+В процессе (через ASGI, с lifespan приложения; Postgres и Redis из настроек сервиса):
+    python -m auth_service.tests.benchmarks.auth_load -c 20 -n 500
+
+В процессе без внешних сервисов (SQLite-файл и кэш в памяти; aiosqlite - из tests/functional/requirements.txt):
+    POSTGRES_DSN=sqlite+aiosqlite:////tmp/auth_bench.db CACHE_BACKEND=memory \
+        python -m auth_service.tests.benchmarks.auth_load -c 20 -n 500
+
+Против поднятого сервиса (SQL и Redis не считаются):
+    python -m auth_service.tests.benchmarks.auth_load --url http://localhost:8080 -c 20 -n 500 --scenario me
+
+Сценарий check-permissions выполняется от пользователя с правами на эндпоинт (по умолчанию - админ).
+Лимиты login/register/refresh (RATE_LIMITS) отклонят большую часть прогона с одного адреса - для замеров самих
+эндпоинтов их выключают: RATE_LIMITS='{}'.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Awaitable, Callable
+
+import httpx
+
+ACCESS_COOKIE = 'user_access_token'
+REFRESH_COOKIE = 'user_refresh_token'
+CHECK_URL = '/api/v1/roles/check-user-permissions'
+
+
+@dataclass
+class Counters:
+    sql: int = 0
+    redis: int = 0
+
+
+# INFO счетчики текущего запроса: ASGITransport выполняет приложение в задаче клиента,
+# поэтому запросы фоновых задач (история входов, pub/sub) сюда не попадают
+_counters: ContextVar[Counters | None] = ContextVar('benchmark_counters', default=None)
+
+
+class Session:
+    """Cookie одного виртуального пользователя. Клиент общий и cookie не хранит."""
+
+    def __init__(self, client: httpx.AsyncClient) -> None:
+        self.client = client
+        self.cookies: dict[str, str] = {}
+        self.credentials: tuple[str, str] | None = None
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self.cookies:
+            cookie = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'cookie': cookie}
+        response = await self.client.request(method, url, **kwargs)
+        for name in (ACCESS_COOKIE, REFRESH_COOKIE):
+            if value := response.cookies.get(name):
+                self.cookies[name] = value
+        return response
+
+    async def register(self) -> tuple[str, str]:
+        login = f'bench_{uuid.uuid4().hex[:12]}'
+        response = await self.request('POST', '/api/v1/auth/register', json={'login': login, 'password': login})
+        response.raise_for_status()
+        return login, login
+
+    async def login(self, login: str, password: str) -> httpx.Response:
+        self.cookies.clear()
+        return await self.request(
+            'POST', '/api/v1/auth/login', data={'username': login, 'password': password},
+            headers={'user-agent': 'benchmark'},
+        )
+
+
+@dataclass
+class Scenario:
+    """prepare - один раз на виртуального пользователя, before - перед каждым запросом; оба не замеряются."""
+
+    name: str
+    call: Callable[[Session], Awaitable[httpx.Response]]
+    prepare: Callable[[Session, argparse.Namespace], Awaitable[None]] | None = None
+    before: Callable[[Session], Awaitable[None]] | None = None
+
+
+async def _register_and_login(session: Session, args: argparse.Namespace) -> None:
+    session.credentials = await session.register()
+    (await session.login(*session.credentials)).raise_for_status()
+
+
+async def _register(session: Session, args: argparse.Namespace) -> None:
+    session.credentials = await session.register()
+
+
+async def _admin_login(session: Session, args: argparse.Namespace) -> None:
+    session.credentials = (args.login, args.password)
+    (await session.login(*session.credentials)).raise_for_status()
+
+
+async def _relogin(session: Session) -> None:
+    (await session.login(*session.credentials)).raise_for_status()
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        Scenario(
+            'register',
+            lambda session: session.request(
+                'POST', '/api/v1/auth/register',
+                json={'login': f'bench_{uuid.uuid4().hex[:12]}', 'password': 'benchmark'},
+            ),
+        ),
+        Scenario('login', lambda session: session.login(*session.credentials), prepare=_register),
+        Scenario('me', lambda session: session.request('GET', '/api/v1/auth/me/'), prepare=_register_and_login),
+        Scenario(
+            'refresh', lambda session: session.request('GET', '/api/v1/auth/refresh/'), prepare=_register_and_login
+        ),
+        Scenario(
+            'logout', lambda session: session.request('POST', '/api/v1/auth/logout'),
+            prepare=_register, before=_relogin,
+        ),
+        Scenario(
+            'check-permissions',
+            lambda session: session.request('GET', CHECK_URL, params={'request_endpoint': '/api/v1/auth/me/'}),
+            prepare=_admin_login,
+        ),
+    ]
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    sql_per_request: float | None
+    redis_per_request: float | None
+    statuses: dict[int, int] = field(default_factory=dict)
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, args: argparse.Namespace, counted: bool
+) -> Result:
+    sessions = [Session(client) for _ in range(args.concurrency)]
+    if scenario.prepare:
+        await asyncio.gather(*(scenario.prepare(session, args) for session in sessions))
+
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    totals = Counters()
+    remaining = args.requests
+
+    async def worker(session: Session) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            if scenario.before:
+                await scenario.before(session)
+            counters = Counters()
+            token = _counters.set(counters)
+            started = time.perf_counter()
+            try:
+                response = await scenario.call(session)
+            finally:
+                latencies.append((time.perf_counter() - started) * 1000)
+                _counters.reset(token)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            totals.sql += counters.sql
+            totals.redis += counters.redis
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(session) for session in sessions))
+    elapsed = time.perf_counter() - started
+
+    # INFO quantiles(n=100) - 99 границ процентилей; для одного замера берем его самого
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    requests = len(latencies)
+    return Result(
+        scenario=scenario.name,
+        requests=requests,
+        errors=sum(count for status, count in statuses.items() if status >= 400),
+        rps=requests / elapsed,
+        p50_ms=percentiles[49],
+        p95_ms=percentiles[94],
+        p99_ms=percentiles[98],
+        sql_per_request=totals.sql / requests if counted else None,
+        redis_per_request=totals.redis / requests if counted else None,
+        statuses=statuses,
+    )
+
+
+def _counted(method: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    async def wrapper(*args, **kwargs):
+        if counters := _counters.get():
+            counters.redis += 1
+        return await method(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument() -> None:
+    """Подсчет SQL и команд Redis в процессе: событие engine и обертка execute_command клиента Redis.
+
+    С CACHE_BACKEND=memory вместо команд Redis считаются обращения к хранилищу в памяти (одно на команду).
+    """
+    from sqlalchemy import event
+
+    from auth_service.src.cache.cache import memory_storage
+    from auth_service.src.database import redis
+    from auth_service.src.database.session import init_engine
+
+    def count_sql(*_) -> None:
+        if counters := _counters.get():
+            counters.sql += 1
+
+    event.listen(init_engine().sync_engine, 'before_cursor_execute', count_sql)
+
+    if redis.redis is not None:
+        redis.redis.execute_command = _counted(redis.redis.execute_command)
+        return
+    for name in (
+        'save_cache', 'retrieve_cache', 'retrieve_many', 'delete_cache', 'increment', 'publish', 'get_bits', 'set_bits',
+        'gcra',
+    ):
+        setattr(memory_storage, name, _counted(getattr(memory_storage, name)))
+
+
+async def run(args: argparse.Namespace) -> list[Result]:
+    # INFO cookie управляет Session: общий клиент не сохраняет их вовсе
+    jar = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    async with AsyncExitStack() as stack:
+        if args.url:
+            counted = False
+            client = httpx.AsyncClient(base_url=args.url, cookies=jar, timeout=args.timeout)
+        else:
+            from auth_service.src.main import app, lifespan
+
+            await stack.enter_async_context(lifespan(app))
+            instrument()
+            counted = True
+            transport = httpx.ASGITransport(app=app)
+            client = httpx.AsyncClient(transport=transport, base_url='http://test', cookies=jar, timeout=args.timeout)
+        await stack.enter_async_context(client)
+        return [await run_scenario(client, SCENARIOS[name], args, counted) for name in args.scenario]
+
+
+def print_table(results: list[Result]) -> None:
+    print(f"{'scenario':<18}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'sql/req':>9}{'redis/req':>10}")
+    for result in results:
+        sql = f'{result.sql_per_request:.2f}' if result.sql_per_request is not None else '-'
+        redis = f'{result.redis_per_request:.2f}' if result.redis_per_request is not None else '-'
+        print(f'{result.scenario:<18}{result.requests:>9}{result.errors:>8}{result.rps:>9.1f}'
+              f'{result.p50_ms:>9.2f}{result.p95_ms:>9.2f}{result.p99_ms:>9.2f}{sql:>9}{redis:>10}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='адрес поднятого сервиса; без него приложение запускается в процессе')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='по умолчанию - все')
+    parser.add_argument('-c', '--concurrency', type=int, default=10, help='число виртуальных пользователей')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('--login', default=os.getenv('ADMIN_LOGIN', 'admin'))
+    parser.add_argument('--password', default=os.getenv('ADMIN_PASSWORD'))
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', dest='json_path', help='сохранить результаты в JSON (для сравнения прогонов)')
+    args = parser.parse_args()
+    args.scenario = args.scenario or list(SCENARIOS)
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    if args.json_path:
+        with open(args.json_path, 'w') as file:
+            json.dump([asdict(result) for result in results], file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
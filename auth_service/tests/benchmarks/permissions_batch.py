@@ -0,0 +1,90 @@
+"""Сравнение N одиночных /check-user-permissions с одним /check-user-permissions/batch.
+
+Запуск против поднятого сервиса:
+    python -m auth_service.tests.benchmarks.permissions_batch --url http://localhost:8080 -n 200
+
+Пользователь должен иметь права на оба эндпоинта (по умолчанию - админ из ADMIN_LOGIN/ADMIN_PASSWORD).
+
+Пример (uvicorn, один процесс, SQLite-файл и кэш в памяти, --rounds 5):
+    POSTGRES_DSN=sqlite+aiosqlite:////tmp/b8.db CACHE_BACKEND=memory PASSWORD_HASH_EXECUTOR=thread \
+        python -m uvicorn auth_service.src.main:app --port 8099
+    python -m auth_service.tests.benchmarks.permissions_batch --url http://127.0.0.1:8099 -n 200 --rounds 5
+
+    n=10:  10 x single 50.8 ms, batch 5.6 ms
+    n=50:  50 x single 211.7 ms, batch 4.9 ms
+    n=200: 200 x single 922.6 ms, batch 5.5 ms
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+SINGLE_URL = '/api/v1/roles/check-user-permissions'
+BATCH_URL = '/api/v1/roles/check-user-permissions/batch'
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> None:
+    response = await client.post(
+        '/api/v1/auth/login', data={'username': username, 'password': password}, headers={'user-agent': 'benchmark'}
+    )
+    response.raise_for_status()
+
+
+async def single_calls(client: httpx.AsyncClient, endpoints: list[str]) -> dict[str, bool]:
+    result = {}
+    for endpoint in endpoints:
+        response = await client.get(SINGLE_URL, params={'request_endpoint': endpoint})
+        response.raise_for_status()
+        result[endpoint] = response.json()
+    return result
+
+
+async def batch_call(client: httpx.AsyncClient, endpoints: list[str]) -> dict[str, bool]:
+    response = await client.post(BATCH_URL, json={'endpoints': endpoints})
+    response.raise_for_status()
+    return response.json()['allowed']
+
+
+async def compare(client: httpx.AsyncClient, n: int, rounds: int) -> dict[str, float]:
+    """Медиана времени (мс) проверки n эндпоинтов: n одиночных запросов против одного batch."""
+    endpoints = [f'/api/v1/films/category/{i}' for i in range(n - 1)] + [SINGLE_URL]
+
+    # прогрев: кэш решений, соединения пула
+    assert await single_calls(client, endpoints[:5]) == await batch_call(client, endpoints[:5])
+
+    timings: dict[str, list[float]] = {'single': [], 'batch': []}
+    for _ in range(rounds):
+        started = time.perf_counter()
+        single = await single_calls(client, endpoints)
+        timings['single'].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        batch = await batch_call(client, endpoints)
+        timings['batch'].append((time.perf_counter() - started) * 1000)
+        assert single == batch
+
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=os.getenv('AUTH_SERVICE_URL', 'http://localhost:8080'))
+    parser.add_argument('--login', default=os.getenv('ADMIN_LOGIN', 'admin'))
+    parser.add_argument('--password', default=os.getenv('ADMIN_PASSWORD'))
+    parser.add_argument('-n', type=int, default=200, help='количество проверяемых эндпоинтов')
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        await login(client, args.login, args.password)
+        result = await compare(client, args.n, args.rounds)
+
+    print(f"n={args.n}: {args.n} x single {result['single']:.1f} ms, batch {result['batch']:.1f} ms, "
+          f"x{result['single'] / result['batch']:.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""Права в access token: список путей (claim permissions, до bitset) против bitset с версией роли (perms).
+
+Для каждого варианта печатает размер токена, время проверки подписи с разбором (verify_token) и время проверки
+права на один путь так, как ее делает сервис: права токена из PermissionRegistry, шаблон пути - route_resolver.
+Права - все маршруты приложения (как в add_permissions_in_db), роль со всеми правами (админ).
+
+Запуск без внешних сервисов (нужны только переменные окружения сервиса):
+    python -m auth_service.tests.benchmarks.token_claims -n 20000
+
+Пример (HS256, JWT_SECRET_KEY из окружения, SQLite и кэш в памяти - база не используется):
+    POSTGRES_DSN=sqlite+aiosqlite:////tmp/tc.db CACHE_BACKEND=memory \
+        python -m auth_service.tests.benchmarks.token_claims -n 20000 --repeat 9
+
+    HS256, 31 маршрутов, -n 20000, медиана из 9 повторов
+    permissions: token 1667 bytes, verify 67.7 us, check 6.49 us
+    bitset:      token  464 bytes, verify 49.8 us, check 3.57 us
+
+Размер и verify стабильны между запусками (-72% и -20..25%). check шумит: в других запусках варианты
+отличались меньше чем на 1.5 us и в обе стороны - основное время проверки занимают поиск шаблона и await.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from fastapi.routing import APIRoute
+from starlette.routing import Route
+
+from auth_service.src.database.models.role import Permission
+from auth_service.src.main import app
+from auth_service.src.security.JWTAuth import JWTAuth, JWTConfig
+from auth_service.src.security.matcher import route_resolver
+from auth_service.src.security.permissions import encode_bitset, permission_registry
+
+
+def median_us(func, n: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(n):
+            func()
+        timings.append((time.perf_counter() - started) / n * 1_000_000)
+    return statistics.median(timings)
+
+
+async def median_us_async(func, n: int, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(n):
+            await func()
+        timings.append((time.perf_counter() - started) / n * 1_000_000)
+    return statistics.median(timings)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', type=int, default=20000, help='итераций в одном замере')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    routes = sorted(route.path for route in app.routes if isinstance(route, APIRoute))
+    route_resolver.load(route.path for route in app.routes if isinstance(route, Route))
+    permission_registry.load([Permission(allowed=path, index=index) for index, path in enumerate(routes)])
+    config = JWTConfig()
+    jwt_auth = JWTAuth(config=config)
+    claims = {'device_id': str(uuid.uuid4()), 'epoch': 0}
+    variants = {
+        'permissions': {**claims, 'permissions': routes},
+        'bitset': {**claims, 'role': str(uuid.uuid4()), 'rv': 1, 'perms': encode_bitset(range(len(routes)))},
+    }
+    # INFO права из токена со списком путей раскладываются в frozenset на каждой проверке, из bitset - берутся из LRU
+    path = routes[-1]
+
+    print(f'{config.algorithm}, {len(routes)} маршрутов, -n {args.n}, медиана из {args.repeat} повторов')
+    for name, payload in variants.items():
+        token = jwt_auth.generate_access_token(subject='admin', payload=payload)
+        decoded = jwt_auth.verify_token(token)
+
+        async def check():
+            assert route_resolver.is_granted(path, await permission_registry.granted(decoded))
+
+        verify = median_us(lambda: jwt_auth.verify_token(token), args.n, args.repeat)
+        check_us = await median_us_async(check, args.n, args.repeat)
+        print(f'{name + ":":<12} token {len(token):>4} bytes, verify {verify:.1f} us, check {check_us:.2f} us')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
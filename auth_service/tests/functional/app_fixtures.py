@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest_asyncio
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+
+from auth_service.src.database.history_writer import HISTORY_WRITER_TASK
+from auth_service.src.database.session import init_engine
+from auth_service.src.main import app, lifespan
+
+
+@pytest_asyncio.fixture(name='app_client', scope='session')
+async def app_client():
+    """Клиент к приложению, запущенному в процессе теста (ASGI), а не по сети."""
+    async with lifespan(app):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url='http://test') as client:
+            yield client
+
+
+@pytest_asyncio.fixture(name='sql_statements')
+def sql_statements():
+    """Список SQL-запросов, выполненных обработчиками запросов за время теста.
+
+    Фоновая запись истории входов не учитывается: приложение живет всю сессию тестов, и пачка входов
+    предыдущего теста может записаться в любой момент.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        task = asyncio.current_task()
+        if task is not None and task.get_name() == HISTORY_WRITER_TASK:
+            return
+        statements.append(statement)
+
+    engine = init_engine().sync_engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
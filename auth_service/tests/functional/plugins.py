@@ -2,5 +2,6 @@
 
 pytest_plugins = [
     "redis_fixtures",
-    "http_fixtures"
-]
\ No newline at end of file
+    "http_fixtures",
+    "app_fixtures",
+]
@@ -2,9 +2,16 @@ import pytest_asyncio
 from redis.asyncio import Redis
 from settings import test_settings
 
+from auth_service.src.cache.cache import memory_storage
+from auth_service.src.core.config import settings
+
+
 @pytest_asyncio.fixture(autouse=True)
 async def redis_client():
     yield
+    if settings.CACHE_BACKEND == "memory":
+        memory_storage.clear()
+        return
     redis = Redis(host=test_settings.REDIS_HOST, port=test_settings.REDIS_PORT)
     await redis.flushall()
     await redis.aclose()
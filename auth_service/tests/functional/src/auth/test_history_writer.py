@@ -0,0 +1,37 @@
+import asyncio
+import uuid
+
+import pytest
+from plugins import pytest_plugins
+from sqlalchemy.exc import DataError, OperationalError
+
+from auth_service.src.database.history_writer import USER_AGENT_MAX_LENGTH, HistoryWriter
+from auth_service.src.database.repository.user import UserRepository
+
+
+@pytest.mark.asyncio
+async def test_memory_batch_keeps_good_rows(app_client, monkeypatch):
+    """Строку, отвергнутую базой, теряет только ее вход; при недоступной базе пачка пишется повторно."""
+    written = []
+    failures = ['unavailable']
+
+    async def add_history_batch(repository, connections):
+        if failures:
+            raise OperationalError('INSERT', {}, Exception(failures.pop()))
+        if any(connection['info'] == 'bad' for connection in connections):
+            raise DataError('INSERT', {}, Exception('value too long'))
+        written.extend(connections)
+
+    monkeypatch.setattr(UserRepository, 'add_history_batch', add_history_batch)
+    writer = HistoryWriter(mode='memory', batch_size=10, flush_interval=0.05, queue_size=100, max_deliveries=3)
+    await writer.start()
+    for user_agent in ('first', 'bad', 'x' * 500):
+        await writer.add(uuid.uuid4(), user_agent)
+    for _ in range(300):
+        if writer.metrics.written == 2:
+            break
+        await asyncio.sleep(0.01)
+    await writer.shutdown()
+
+    assert [connection['info'] for connection in written] == ['first', 'x' * USER_AGENT_MAX_LENGTH]
+    assert writer.metrics.errors == 2
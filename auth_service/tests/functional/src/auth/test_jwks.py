@@ -0,0 +1,18 @@
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+
+
+@pytest.mark.asyncio
+async def test_jwks_etag(app_client):
+    """JWKS отдается с ETag и Cache-Control, повторный запрос с If-None-Match получает 304."""
+    response = await app_client.get('/.well-known/jwks.json')
+
+    assert response.status_code == HTTPStatus.OK
+    assert 'max-age' in response.headers['cache-control']
+    assert 'keys' in response.json()
+
+    response = await app_client.get('/.well-known/jwks.json', headers={'if-none-match': response.headers['etag']})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
@@ -0,0 +1,22 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+
+
+@pytest.mark.asyncio
+async def test_metrics_route_template(app_client):
+    """Латентность пишется по маршруту (неизвестные пути - unmatched), время логина - по SQL, JWT и хешированию."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    await app_client.get(f'/api/v1/{uuid.uuid4()}')
+
+    response = await app_client.get('/metrics')
+
+    assert response.status_code == HTTPStatus.OK
+    assert 'route="/api/v1/auth/login",status="200"' in response.text
+    assert 'route="unmatched",status="404"' in response.text
+    for component in ('sql', 'jwt', 'hash'):
+        assert f'auth_request_component_duration_seconds_count{{component="{component}",route="/api/v1/auth/login"}}' in response.text
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+from sqlalchemy import select, update
+
+from auth_service.src.core.config import settings
+from auth_service.src.database.models.user import User
+from auth_service.src.database.session import get_db_session_for_main
+from auth_service.src.security.hashing import build_context, password_hasher
+from auth_service.src.services.auth import wait_rehash_tasks
+
+
+async def get_password_hash(login: str) -> str:
+    async with get_db_session_for_main() as session:
+        return await session.scalar(select(User.password).where(User.login == login))
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_hash(app_client):
+    """Хеш с другими раундами работает для входа и после него пересчитывается в фоне под текущие настройки."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    weak_hash = build_context(settings.PASSWORD_HASH_SCHEME, 1000).hash(login)
+    async with get_db_session_for_main() as session:
+        await session.execute(update(User).where(User.login == login).values(password=weak_hash))
+        await session.commit()
+    assert password_hasher.needs_update(weak_hash)
+
+    response = await app_client.post(
+        '/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'}
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    for _ in range(50):
+        current_hash = await get_password_hash(login)
+        if current_hash != weak_hash:
+            break
+        await asyncio.sleep(0.05)
+    assert not password_hasher.needs_update(current_hash)
+    assert await password_hasher.verify(login, current_hash)
+
+
+@pytest.mark.asyncio
+async def test_blocked_user_hash_not_rehashed(app_client):
+    """Заблокированный пользователь получает 403, и его устаревший хеш не пересчитывается."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    weak_hash = build_context(settings.PASSWORD_HASH_SCHEME, 1000).hash(login)
+    async with get_db_session_for_main() as session:
+        await session.execute(update(User).where(User.login == login).values(password=weak_hash, is_active=False))
+        await session.commit()
+
+    response = await app_client.post(
+        '/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'}
+    )
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+    await asyncio.sleep(0.5)
+    assert await get_password_hash(login) == weak_hash
+
+
+@pytest.mark.asyncio
+async def test_wait_rehash_tasks(app_client):
+    """Остановка воркера дожидается фонового пересчета хеша, начатого входом."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    weak_hash = build_context(settings.PASSWORD_HASH_SCHEME, 1000).hash(login)
+    async with get_db_session_for_main() as session:
+        await session.execute(update(User).where(User.login == login).values(password=weak_hash))
+        await session.commit()
+
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    await wait_rehash_tasks()
+
+    assert not password_hasher.needs_update(await get_password_hash(login))
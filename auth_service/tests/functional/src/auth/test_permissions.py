@@ -0,0 +1,135 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+from settings import test_settings
+
+from auth_service.src.database.models.role import Permission
+from auth_service.src.security.matcher import RouteResolver, route_resolver
+from auth_service.src.security.permissions import PermissionRegistry, decode_bitset, encode_bitset
+
+
+@pytest.mark.asyncio
+async def test_check_permissions_batch(app_client, sql_statements):
+    """Пакетная проверка отвечает по правам из токена, порядок bitmap совпадает с запросом."""
+    await app_client.post(
+        '/api/v1/auth/login',
+        data={'username': test_settings.ADMIN_LOGIN, 'password': test_settings.ADMIN_PASSWORD},
+        headers={'user-agent': 'pytest'},
+    )
+    endpoints = ['/api/v1/roles/get-all', '/api/v1/films/unknown', '/api/v1/auth/me/']
+    await app_client.post('/api/v1/roles/check-user-permissions/batch', json={'endpoints': endpoints})
+
+    sql_statements.clear()
+    response = await app_client.post('/api/v1/roles/check-user-permissions/batch', json={'endpoints': endpoints})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['bitmap'] == '101'
+    assert response.json()['allowed'] == dict(zip(endpoints, [True, False, True]))
+    assert sql_statements == []
+
+
+@pytest.mark.asyncio
+async def test_check_permissions_route_template(app_client):
+    """Путь сопоставляется с шаблоном маршрута: без учета завершающего слэша и с подстановкой параметров."""
+    await app_client.post(
+        '/api/v1/auth/login',
+        data={'username': test_settings.ADMIN_LOGIN, 'password': test_settings.ADMIN_PASSWORD},
+        headers={'user-agent': 'pytest'},
+    )
+    response = await app_client.get(
+        '/api/v1/roles/check-user-permissions', params={'request_endpoint': '/api/v1/auth/me'}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() is True
+
+
+def test_static_sibling_not_granted_by_param_route():
+    """Право на /roles/{pk} не дает доступа к статическому соседу /roles/set_role: путь находит свой маршрут."""
+    resolver = RouteResolver()
+    resolver.load(['/api/v1/roles/{pk}', '/api/v1/roles/set_role'])
+    granted = frozenset({'/api/v1/roles/{pk}'})
+
+    assert resolver.is_granted('/api/v1/roles/42', granted)
+    assert resolver.resolve('/api/v1/roles/set_role') == '/api/v1/roles/set_role'
+    assert not resolver.is_granted('/api/v1/roles/set_role', granted)
+
+
+@pytest.mark.asyncio
+async def test_routes_resolved_from_app(app_client):
+    """Дерево маршрутов строится при старте из маршрутов приложения, включая не-API (/metrics)."""
+    template = route_resolver.resolve('/api/v1/service/profiler/profiles/a.json')
+    assert template == '/api/v1/service/profiler/profiles/{name}'
+    assert route_resolver.resolve('/metrics') == '/metrics'
+    assert route_resolver.resolve('/api/v1/films/unknown') is None
+
+
+@pytest.mark.asyncio
+async def test_revoked_permission_rejects_old_token(app_client):
+    """После отзыва права у роли старый access token пользователя получает 403, а не перевыпуск с доступом."""
+    admin = {'username': test_settings.ADMIN_LOGIN, 'password': test_settings.ADMIN_PASSWORD}
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data=admin, headers={'user-agent': 'pytest'})
+    role = (await app_client.post('/api/v1/roles/create', json={'name': f'role_{uuid.uuid4().hex[:8]}'})).json()
+    await app_client.post(
+        '/api/v1/roles/set-permissions-to-role', params={'role_pk': role['pk']}, json=['/api/v1/auth/me/']
+    )
+    await app_client.patch('/api/v1/roles/set-role-for-user', params={'role_pk': role['pk'], 'login': login})
+
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    user_cookie = {'Cookie': f"user_access_token={app_client.cookies['user_access_token']}"}
+    app_client.cookies.clear()
+    assert (await app_client.get('/api/v1/auth/me/', headers=user_cookie)).status_code == HTTPStatus.OK
+
+    await app_client.post('/api/v1/auth/login', data=admin, headers={'user-agent': 'pytest'})
+    response = await app_client.post(
+        '/api/v1/roles/revoke-permissions-from-role', params={'role_pk': role['pk']}, json=['/api/v1/auth/me/']
+    )
+    assert response.status_code == HTTPStatus.OK
+    app_client.cookies.clear()
+
+    for _ in range(2):
+        response = await app_client.get('/api/v1/auth/me/', headers=user_cookie)
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+def test_bitset_round_trip():
+    """Bitset кодирует любые индексы, в том числе за границей байта и пустой набор."""
+    indexes = {0, 5, 7, 8, 63, 64, 200}
+
+    assert decode_bitset(encode_bitset(indexes)) == sum(1 << index for index in indexes)
+    assert encode_bitset([]) == ''
+    assert decode_bitset('') == 0
+
+
+@pytest.mark.asyncio
+async def test_registry_reloads_on_unknown_index():
+    """Индекс, которого нет в реестре (право создано другим воркером), перечитывает реестр один раз."""
+    stored = [Permission(allowed='/api/v1/a', index=0), Permission(allowed='/api/v1/b', index=2)]
+
+    class Registry(PermissionRegistry):
+        refreshes = 0
+
+        async def refresh(self):
+            self.refreshes += 1
+            self.load(stored)
+
+    registry = Registry()
+    registry.load(stored[:1])
+    payload = {'role': str(uuid.uuid4()), 'rv': 1, 'perms': encode_bitset([0, 2])}
+
+    assert await registry.granted(payload) == {'/api/v1/a', '/api/v1/b'}
+    assert await registry.granted(payload) == {'/api/v1/a', '/api/v1/b'}
+    assert registry.refreshes == 1
+
+
+@pytest.mark.asyncio
+async def test_registry_accepts_legacy_permissions_claim():
+    """Токены, выпущенные до bitset, несут список путей в permissions - он принимается как есть."""
+    registry = PermissionRegistry()
+
+    assert await registry.granted({'permissions': ['/api/v1/auth/me/']}) == {'/api/v1/auth/me/'}
+    assert await registry.granted({'perms': ''}) == frozenset()
@@ -0,0 +1,59 @@
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+from redis.exceptions import RedisError
+from settings import test_settings
+
+from auth_service.src.core.profiling import request_profiler
+
+
+@pytest.mark.asyncio
+async def test_profiler_next_requests(app_client):
+    """Профилируются ровно count следующих запросов к маршруту, профили доступны админу в формате speedscope."""
+    await app_client.post(
+        '/api/v1/auth/login',
+        data={'username': test_settings.ADMIN_LOGIN, 'password': test_settings.ADMIN_PASSWORD},
+        headers={'user-agent': 'pytest'},
+    )
+    before = {profile['name'] for profile in (await app_client.get('/api/v1/service/profiler/profiles')).json()}
+    response = await app_client.post('/api/v1/service/profiler', json={'route': '/api/v1/roles/get-all', 'count': 2})
+    assert response.status_code == HTTPStatus.CREATED
+
+    for _ in range(3):
+        await app_client.get('/api/v1/roles/get-all')
+    await app_client.get('/api/v1/auth/me/')
+
+    profiles = (await app_client.get('/api/v1/service/profiler/profiles')).json()
+    new = [profile['name'] for profile in profiles if profile['name'] not in before]
+    assert len(new) == 2
+    assert all('roles_get_all' in name for name in new)
+    assert (await app_client.get('/api/v1/service/profiler')).json() == []
+
+    response = await app_client.get(f'/api/v1/service/profiler/profiles/{new[0]}')
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['$schema'] == 'https://www.speedscope.app/file-format-schema.json'
+
+
+@pytest.mark.asyncio
+async def test_profiler_failures_do_not_break_requests(app_client, monkeypatch):
+    """Сбой Redis при отборе запроса или ошибка записи профиля не ломают сам запрос."""
+    await app_client.post(
+        '/api/v1/auth/login',
+        data={'username': test_settings.ADMIN_LOGIN, 'password': test_settings.ADMIN_PASSWORD},
+        headers={'user-agent': 'pytest'},
+    )
+    await app_client.post('/api/v1/service/profiler', json={'route': '/api/v1/roles/get-all', 'count': 5})
+
+    def broken_save(*args):
+        raise ValueError('render failed')
+
+    monkeypatch.setattr(request_profiler, 'save', broken_save)
+    assert (await app_client.get('/api/v1/roles/get-all')).status_code == HTTPStatus.OK
+
+    class BrokenCache:
+        async def increment(self, key):
+            raise RedisError('connection lost')
+
+    assert await request_profiler.take(BrokenCache(), {'path': '/api/v1/roles/get-all', 'headers': []}) is None
+    await app_client.delete('/api/v1/service/profiler')
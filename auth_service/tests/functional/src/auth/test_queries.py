@@ -0,0 +1,105 @@
+import asyncio
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+from settings import test_settings
+
+from auth_service.src.cache.cache import get_cache_storage
+from auth_service.src.cache.login_filter import login_filter
+from auth_service.src.database.query_log import capture_queries, max_queries
+
+
+@pytest.mark.asyncio
+async def test_me_sql_statements(app_client, sql_statements):
+    """/me/ авторизует запрос одним SELECT по users, без истории входов, токенов и пользователей роли."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    response = await app_client.post(
+        '/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'}
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    sql_statements.clear()
+    response = await app_client.get('/api/v1/auth/me/')
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(sql_statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_me_cached_decision(app_client, sql_statements):
+    """Повторный запрос с тем же токеном отвечается из кэша решений без обращения к Postgres."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    await app_client.get('/api/v1/auth/me/')
+
+    sql_statements.clear()
+    response = await app_client.get('/api/v1/auth/me/')
+
+    assert response.status_code == HTTPStatus.OK
+    assert sql_statements == []
+
+
+@pytest.mark.asyncio
+async def test_get_all_roles_no_n_plus_one(app_client):
+    """Число запросов /roles/get-all не растет с числом ролей: права подгружаются одним selectin."""
+    await app_client.post(
+        '/api/v1/auth/login',
+        data={'username': test_settings.ADMIN_LOGIN, 'password': test_settings.ADMIN_PASSWORD},
+        headers={'user-agent': 'pytest'},
+    )
+    await app_client.post('/api/v1/roles/create', json={'name': f'role_{uuid.uuid4().hex[:8]}'})
+    with capture_queries() as baseline:
+        await app_client.get('/api/v1/roles/get-all')
+
+    for _ in range(3):
+        await app_client.post('/api/v1/roles/create', json={'name': f'role_{uuid.uuid4().hex[:8]}'})
+    with max_queries(len(baseline)) as log:
+        response = await app_client.get('/api/v1/roles/get-all')
+
+    assert response.status_code == HTTPStatus.OK
+    assert log.duplicates() == {}
+
+
+@pytest.mark.asyncio
+async def test_parallel_requests_share_user_lookup(app_client, sql_statements):
+    """Параллельные запросы с одним токеном (рендер страницы) читают пользователя одним SELECT."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    # новым токеном еще не было запросов - кэш решений пуст
+
+    sql_statements.clear()
+    responses = await asyncio.gather(*(app_client.get('/api/v1/auth/me/') for _ in range(5)))
+
+    assert [response.status_code for response in responses] == [HTTPStatus.OK] * 5
+    assert len([statement for statement in sql_statements if 'FROM users' in statement]) == 1
+
+
+@pytest.mark.asyncio
+async def test_login_filter_skips_unknown_logins(app_client, sql_statements):
+    """По собранному фильтру логинов регистрация не ищет логин SELECT-ом, а вход с неизвестным логином не идет в базу."""
+    await login_filter.rebuild(await get_cache_storage())
+    login = f'user_{uuid.uuid4().hex[:8]}'
+
+    sql_statements.clear()
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    users_statements = [statement for statement in sql_statements if 'users' in statement]
+    # первое обращение к users - сам INSERT, без предварительной проверки логина
+    assert users_statements[0].startswith('INSERT INTO users')
+
+    sql_statements.clear()
+    unknown = await app_client.post(
+        '/api/v1/auth/login', data={'username': f'{login}_x', 'password': login}, headers={'user-agent': 'pytest'}
+    )
+    assert unknown.status_code == HTTPStatus.UNAUTHORIZED
+    assert sql_statements == []
+
+    # новый логин внесен в фильтр при регистрации
+    response = await app_client.post(
+        '/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'}
+    )
+    assert response.status_code == HTTPStatus.OK
@@ -0,0 +1,38 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+from starlette.requests import Request
+
+from auth_service.src.security.hashing import password_hasher
+from auth_service.src.security.rate_limit import client_ip
+
+
+@pytest.mark.asyncio
+async def test_login_rate_limited_before_hashing(app_client):
+    """Сверх лимита по логину вход получает 429 с Retry-After, не доходя до хеширования; другой логин не затронут."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    form = {'username': login, 'password': 'wrong'}
+    headers = {'user-agent': 'pytest', 'X-Real-IP': '10.0.0.1'}
+    for _ in range(10):
+        response = await app_client.post('/api/v1/auth/login', data=form, headers=headers)
+        assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    hashed = password_hasher.metrics.calls
+    limited = await app_client.post('/api/v1/auth/login', data=form, headers=headers)
+    other = await app_client.post('/api/v1/auth/login', data={**form, 'username': f'{login}_x'}, headers=headers)
+
+    assert limited.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert 1 <= int(limited.headers['retry-after']) <= 6
+    assert other.status_code == HTTPStatus.UNAUTHORIZED
+    assert password_hasher.metrics.calls == hashed + 1
+
+
+def test_real_ip_only_from_trusted_proxy():
+    """X-Real-IP учитывается только от nginx: клиент в обход прокси не выберет себе адрес для лимита."""
+    def request(peer):
+        return Request({'type': 'http', 'headers': [(b'x-real-ip', b'10.0.0.1')], 'client': (peer, 40000)})
+
+    assert client_ip(request('172.18.0.10')) == '10.0.0.1'
+    assert client_ip(request('203.0.113.5')) == '203.0.113.5'
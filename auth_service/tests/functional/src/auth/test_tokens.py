@@ -0,0 +1,69 @@
+import json
+import time
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+
+from auth_service.src.cache.cache import Cache, InMemoryCacheStorage
+from auth_service.src.cache.decision import DecisionCache
+from auth_service.src.dto.user import UserPrincipalDTO
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_reuse_revokes_device(app_client):
+    """Повторное использование refresh token отзывает все токены устройства."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    old_refresh_token = app_client.cookies['user_refresh_token']
+
+    response = await app_client.get('/api/v1/auth/refresh/')
+    assert response.status_code == HTTPStatus.OK
+    new_access_token = response.json()['access_token']
+
+    app_client.cookies.clear()
+    response = await app_client.get('/api/v1/auth/refresh/', headers={'Cookie': f'user_refresh_token={old_refresh_token}'})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+    response = await app_client.get('/api/v1/auth/me/', headers={'Cookie': f'user_access_token={new_access_token}'})
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+@pytest.mark.asyncio
+async def test_refresh_right_after_login(app_client):
+    """Первый refresh сразу после регистрации и входа ротирует токены, а не отзывает устройство."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+
+    response = await app_client.get('/api/v1/auth/refresh/')
+    assert response.status_code == HTTPStatus.OK
+
+    response = await app_client.get('/api/v1/auth/me/')
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_decision_invalidation_reaches_other_workers():
+    """Выход и сброс решений пользователя рассылаются через канал: L1 другого воркера их не отдает."""
+    other_worker = DecisionCache(maxsize=10, local_ttl=60, ttl=60)
+
+    class Channel(Cache):
+        async def publish(self, channel, message):
+            other_worker.apply(json.loads(message))
+
+    cache = Channel(storage=InMemoryCacheStorage())
+    this_worker = DecisionCache(maxsize=10, local_ttl=60, ttl=60)
+    principal = UserPrincipalDTO(pk=uuid.uuid4(), login='user')
+    first, second = ({'jti': uuid.uuid4().hex, 'sub': 'user', 'exp': time.time() + 60} for _ in range(2))
+    for payload in (first, second):
+        other_worker.remember(payload, '/api/v1/auth/me/', principal)
+
+    await this_worker.forget_token(cache, first['jti'])
+    assert (await other_worker.get(cache, first, '/api/v1/auth/me/', [])).principal is None
+    assert (await other_worker.get(cache, second, '/api/v1/auth/me/', [])).principal == principal
+
+    await this_worker.invalidate_user(cache, 'user')
+    assert (await other_worker.get(cache, second, '/api/v1/auth/me/', [])).principal is None
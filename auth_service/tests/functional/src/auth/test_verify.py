@@ -0,0 +1,39 @@
+import uuid
+from http import HTTPStatus
+
+import pytest
+from plugins import pytest_plugins
+
+
+@pytest.mark.asyncio
+async def test_verify_without_database(app_client, sql_statements):
+    """/verify отвечает по токену и Redis без SQL: личность в X-Auth-*, max-age не больше жизни токена."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+
+    sql_statements.clear()
+    allowed = await app_client.get('/api/v1/auth/verify', headers={'X-Original-URI': '/api/v1/auth/me/?x=1'})
+    forbidden = await app_client.get('/api/v1/auth/verify', headers={'X-Original-URI': '/api/v1/roles/get-all'})
+
+    assert sql_statements == []
+    assert allowed.status_code == HTTPStatus.OK
+    assert allowed.headers['x-auth-login'] == login
+    assert 0 < int(allowed.headers['cache-control'].removeprefix('max-age=')) <= 30 * 60
+    assert forbidden.status_code == HTTPStatus.FORBIDDEN
+    assert forbidden.headers['cache-control'] == 'no-store'
+
+
+@pytest.mark.asyncio
+async def test_verify_revoked_token(app_client):
+    """После logout токен отклоняется, даже если предъявлен в Authorization: Bearer."""
+    login = f'user_{uuid.uuid4().hex[:8]}'
+    await app_client.post('/api/v1/auth/register', json={'login': login, 'password': login})
+    await app_client.post('/api/v1/auth/login', data={'username': login, 'password': login}, headers={'user-agent': 'pytest'})
+    access_token = app_client.cookies['user_access_token']
+    await app_client.post('/api/v1/auth/logout')
+    app_client.cookies.clear()
+
+    response = await app_client.get('/api/v1/auth/verify', headers={'Authorization': f'Bearer {access_token}'})
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -1,19 +1,29 @@
 import asyncio
+import os
+import secrets
+import time
+from datetime import datetime
 
 import typer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
 from fastapi import Request, Response
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from auth_service.src.cache.cache import get_cache_storage
+from auth_service.src.cache.login_filter import login_filter
 from auth_service.src.core.config import settings
+from auth_service.src.database import redis
 from auth_service.src.database.models.role import Role
 from auth_service.src.database.models.user import User
 from auth_service.src.database.repository.role import RoleRepository
 from auth_service.src.database.repository.user import UserRepository
-from auth_service.src.database.session import get_db_session_for_main
+from auth_service.src.database.session import dispose_engine, get_db_session_for_main
 from auth_service.src.dto.user import UserCredentialsDTO
-from auth_service.src.main import add_permissions_in_db
+from auth_service.src.main import run_bootstrap
+from auth_service.src.security.hashing import PASSWORD_HASH_SCHEMES, build_context, calibrate, password_hasher
 from auth_service.src.security.JWTAuth import JWTAuth, JWTConfig
 from auth_service.src.services.auth import AuthService
 from auth_service.src.services.role import RoleService
@@ -60,6 +70,8 @@ async def create_superuser_with_role(session: AsyncSession, login: str):
 
 async def create_superuser(login: str):
     """Ф-я должна запускаться ПОСЛЕ запуска приложения"""
+    # INFO redis нужен для сброса кэша решений авторизации при назначении роли
+    redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
     session = get_db_session_for_main()
 
     async with session as s:
@@ -69,10 +81,13 @@ async def create_superuser(login: str):
 
         if user:
             typer.echo("Пользователь с таким login уже существует!")
-            return
+        else:
+            await create_superuser_with_role(session=s, login=login)
+            typer.echo(f"Суперпользователь {login} создан!")
 
-        await create_superuser_with_role(session=s, login=login)
-        typer.echo(f"Суперпользователь {login} создан!")
+    await password_hasher.shutdown()
+    await dispose_engine()
+    await redis.redis.close()
 
 
 @app.command()
@@ -84,5 +99,97 @@ def createsuperuser(
     asyncio.run(create_superuser(login))
 
 
+async def bootstrap_service(force: bool):
+    redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    try:
+        if await run_bootstrap(force=force):
+            typer.echo("Bootstrap выполнен")
+        else:
+            typer.echo("Bootstrap этой версии уже выполнен")
+        if await login_filter.rebuild(await get_cache_storage()):
+            typer.echo("Фильтр логинов собран")
+    finally:
+        await password_hasher.shutdown()
+        await dispose_engine()
+        await redis.redis.close()
+
+
+@app.command()
+def bootstrap(force: bool = typer.Option(False, help="Выполнить, даже если эта версия уже применена")):
+    """Права, суперпользователь ADMIN_LOGIN и базовые роли. Запускается один раз до старта воркеров gunicorn."""
+    asyncio.run(bootstrap_service(force))
+
+
+@app.command()
+def generate_jwt_key(
+    keys_dir: str = typer.Option(settings.JWT_KEYS_DIR, help="Каталог ключей (JWT_KEYS_DIR)"),
+    algorithm: str = typer.Option(settings.JWT_ALGORITHM, help="RS256 | ES256 | EdDSA"),
+):
+    """Сгенерировать ключ подписи JWT. Новый ключ становится активным, старые остаются в JWKS для проверки."""
+    if algorithm.startswith(("RS", "PS")):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm.startswith("ES"):
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise typer.BadParameter(f"Алгоритм {algorithm} не использует ключевую пару")
+
+    # INFO kid - время создания: сортировка по имени файла совпадает с порядком ротации
+    kid = datetime.now().strftime("%Y%m%d%H%M%S")
+    os.makedirs(keys_dir, exist_ok=True)
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    with open(path, "wb") as key_file:
+        key_file.write(
+            private_key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption(),
+            )
+        )
+    os.chmod(path, 0o600)
+    typer.echo(f"Создан ключ {kid}: {path}")
+
+
+def write_env(path: str, values: dict[str, str]) -> None:
+    """Заменить значения ключей в env-файле (закомментированные строки не трогаются), недостающие - дописать."""
+    lines = []
+    if os.path.exists(path):
+        with open(path) as env_file:
+            lines = env_file.read().splitlines()
+    pending = dict(values)
+    for index, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if key in pending:
+            lines[index] = f"{key}={pending.pop(key)}"
+    lines += [f"{key}={value}" for key, value in pending.items()]
+    with open(path, "w") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+@app.command()
+def calibrate_hash(
+    scheme: str = typer.Option(settings.PASSWORD_HASH_SCHEME, help=f"Схема: {' | '.join(PASSWORD_HASH_SCHEMES)}"),
+    target_ms: int = typer.Option(350, help="Целевое время одного хеширования на этой машине, мс"),
+    env_file: str = typer.Option(
+        settings.model_config["env_file"], help="Куда записать PASSWORD_HASH_SCHEME и PASSWORD_HASH_ROUNDS"
+    ),
+    write: bool = typer.Option(True, help="Записать результат в env-файл (--no-write - только показать)"),
+):
+    """Подобрать раунды хеширования паролей под целевое время на целевой машине и записать их в настройки.
+
+    Хеши пользователей с прежними параметрами пересчитываются при их следующем успешном входе.
+    """
+    if scheme not in PASSWORD_HASH_SCHEMES:
+        raise typer.BadParameter(f"Схема {scheme} не поддерживается")
+    rounds = calibrate(scheme, target_ms / 1000)
+    started = time.perf_counter()
+    build_context(scheme, rounds).hash(secrets.token_urlsafe(16))
+    typer.echo(f"{scheme}: {rounds} раундов, хеширование {(time.perf_counter() - started) * 1000:.0f} мс")
+    if write:
+        write_env(env_file, {"PASSWORD_HASH_SCHEME": scheme, "PASSWORD_HASH_ROUNDS": str(rounds)})
+        typer.echo(f"Записано в {env_file}, перезапустите сервис")
+
+
 if __name__ == "__main__":
     app()
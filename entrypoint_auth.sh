@@ -7,5 +7,9 @@ then
         sleep 0.1
     done
 fi
+# метрики prometheus всех воркеров gunicorn собираются через файлы в этом каталоге
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+mkdir -p $PROMETHEUS_MULTIPROC_DIR
 alembic upgrade head &&\
-gunicorn -w 4 -k uvicorn_worker.UvicornH11Worker --bind 0.0.0.0:8080 main:app
\ No newline at end of file
+python3 createsuperuser.py bootstrap &&\
+gunicorn -c gunicorn.conf.py -w 4 -k uvicorn_worker.UvicornH11Worker --bind 0.0.0.0:8080 main:app
\ No newline at end of file
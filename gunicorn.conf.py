@@ -0,0 +1,18 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # INFO метрики воркеров пишутся в файлы PROMETHEUS_MULTIPROC_DIR; файлы прошлого запуска удаляем
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    # gauge упавшего или перезапущенного воркера не должен суммироваться в /metrics
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)